@@ -0,0 +1,134 @@
+# answer_table.py
+"""
+Table de réponses /predict précalculées pour tout l'espace catégoriel :
+(aucune année | une année du dataset) x (aucune masse | un mass_bin)
+x (aucun continent | un continent).
+
+Construction hors ligne (depuis backend/) :
+    python answer_table.py               # toutes les années du dataset
+    python answer_table.py --no-years    # seulement les sélections sans année
+
+La table porte les empreintes SHA-256 de rules.pkl et du CSV : elle est
+rejetée au chargement si l'un des deux a changé.
+"""
+import argparse
+import gzip
+import hashlib
+import itertools
+import json
+import os
+import pickle
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../training'))
+from rule_engine import (process_user_selection, load_rule_store, build_year_period_table,
+                    format_prediction_response, normalize_selection)
+
+TABLE_FORMAT = 2
+
+DEFAULT_DATASET_PATH = os.path.join(os.path.dirname(__file__), '../data/meteorites_final_rebalanced.csv')
+DEFAULT_RULES_PATH = os.path.join(os.path.dirname(__file__), 'rules.pkl')
+DEFAULT_TABLE_PATH = os.path.join(os.path.dirname(__file__), 'answer_table.json.gz')
+
+# -----------------------------
+# Version (empreintes des fichiers sources)
+# -----------------------------
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def table_version(rules_path, dataset_path):
+    return {
+        'format': TABLE_FORMAT,
+        'rules_sha256': file_sha256(rules_path),
+        'dataset_sha256': file_sha256(dataset_path),
+    }
+
+def _key_to_str(key):
+    years, mass, continents = key
+    return json.dumps([list(years) if years is not None else None, list(mass), list(continents)])
+
+def _to_json(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"Type non sérialisable : {type(value).__name__}")
+
+# -----------------------------
+# Construction
+# -----------------------------
+def selection_grid(df, with_years=True):
+    """Toutes les sélections à une seule valeur (ou vide) par critère."""
+    years = [None]
+    if with_years:
+        known_years = df['year'].dropna()
+        years += [[int(y)] for y in sorted(known_years[known_years % 1 == 0].unique())]
+    masses = [None] + [[m] for m in sorted(df['mass_bin'].dropna().unique())]
+    continents = [None] + [[c] for c in sorted(df['continent'].dropna().unique())]
+
+    for y, m, c in itertools.product(years, masses, continents):
+        yield {"years": y, "mass": m, "continents": c}
+
+def build_answer_table(rules, df, version, with_years=True):
+    store = load_rule_store(rules)
+    year_table = build_year_period_table(df)
+
+    entries = {}
+    start = time.perf_counter()
+    for i, sel in enumerate(selection_grid(df, with_years), start=1):
+        result = process_user_selection(sel, rules, df, store=store, year_table=year_table)
+        entries[_key_to_str(normalize_selection(sel))] = format_prediction_response(result)
+        if i % 1000 == 0:
+            print(f"  {i} sélections ({time.perf_counter() - start:.1f}s)")
+
+    return {'version': version, 'entries': entries}
+
+def save_answer_table(table, path):
+    with gzip.open(path, 'wt', encoding='utf-8') as f:
+        json.dump(table, f, default=_to_json, separators=(',', ':'))
+
+# -----------------------------
+# Chargement et consultation
+# -----------------------------
+def load_answer_table(path, rules_path, dataset_path):
+    """Charge la table et vérifie qu'elle correspond aux rules.pkl/CSV actuels."""
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        table = json.load(f)
+
+    expected = table_version(rules_path, dataset_path)
+    if table.get('version') != expected:
+        raise ValueError(f"table obsolète ({path}) : rules.pkl ou dataset modifié depuis sa construction")
+    return table
+
+def lookup_answer(table, sel, year_table=None):
+    """Réponse précalculée pour la sélection, ou None si hors table."""
+    key = normalize_selection(sel, year_table)
+    if key is None:
+        return None
+    return table['entries'].get(_key_to_str(key))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Précalcule les réponses /predict catégorielles")
+    parser.add_argument('--rules', default=DEFAULT_RULES_PATH)
+    parser.add_argument('--dataset', default=DEFAULT_DATASET_PATH)
+    parser.add_argument('--output', default=DEFAULT_TABLE_PATH)
+    parser.add_argument('--no-years', action='store_true',
+                        help="ne précalculer que les sélections sans année")
+    args = parser.parse_args()
+
+    df = pd.read_csv(args.dataset)
+    with open(args.rules, 'rb') as f:
+        rules = pickle.load(f)
+
+    table = build_answer_table(rules, df, table_version(args.rules, args.dataset),
+                               with_years=not args.no_years)
+    save_answer_table(table, args.output)
+    print(f"✅ {len(table['entries'])} réponses écrites dans {args.output} "
+          f"({os.path.getsize(args.output) / 1024:.0f} Ko)")
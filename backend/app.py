@@ -1,54 +1,447 @@
-import sys, os, pickle
-from flask import Flask, request, jsonify
+import sys, os, pickle, threading, time, hmac, json, base64, binascii, hashlib
+from flask import Flask, Response, request, stream_with_context
 from flask_cors import CORS
 import pandas as pd
 
 sys.path.append(os.path.join(os.path.dirname(__file__), '../training'))
-from REGLES import process_user_selection
+from rule_engine import (cached_process_user_selection, process_user_selection, process_user_selections,
+                    load_rule_store, DEFAULT_PAGE_SIZE,
+                    build_year_period_table, format_prediction_response, SelectionCache,
+                    score_ndjson, peak_rss_mb, StageMetrics, merge_stage_metrics, profile_user_selection)
+from answer_table import load_answer_table, lookup_answer
+from shared_store import open_shared_data, shared_data_version, source_stamps, DEFAULT_SHARED_DIR
+from serialization import dumps, compress
 
 app = Flask(__name__)
 CORS(app)
 
-# Dataset
 dataset_path = os.path.join(os.path.dirname(__file__), '../data/meteorites_final_rebalanced.csv')
-df = pd.read_csv(dataset_path)
-
-# Règles
 rules_path = os.path.join(os.path.dirname(__file__), 'rules.pkl')
-with open(rules_path, 'rb') as f:
-    rules = pickle.load(f)
+shared_data_dir = os.environ.get("SHARED_DATA_DIR", DEFAULT_SHARED_DIR)
+
+# -----------------------------
+# Snapshot versionné des données de service
+# -----------------------------
+def load_snapshot():
+    """
+    Charge règles, dataset, index, table précalculée et cache dans un
+    snapshot immuable. Chaque requête lit la référence courante une seule
+    fois : un rechargement ne touche jamais une requête en cours.
+    """
+    # Dates relevées avant lecture : une écriture pendant le chargement sera revue
+    source_mtimes = _source_mtimes()
+
+    # Bundle colonnaire (voir shared_store.py) : dataset, règles et index ouverts en
+    # mémoire mappée, sans relire le CSV ni rules.pkl, et partagés entre les workers
+    # gunicorn. Taille et date des fichiers sources ne sont comparées que s'ils sont là.
+    # Sinon (bundle absent, obsolète ou illisible) : rules.pkl + CSV.
+    df = rules = rule_store = None
+    if os.path.exists(os.path.join(shared_data_dir, 'manifest.json')):
+        try:
+            sources = None
+            if os.path.exists(rules_path) and os.path.exists(dataset_path):
+                sources = source_stamps(rules_path, dataset_path)
+            df, rules, rule_store, version = open_shared_data(shared_data_dir, sources)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"⚠️ Données partagées ignorées : {e}")
+    if df is None:
+        version = shared_data_version(rules_path, dataset_path)
+        with open(rules_path, 'rb') as f:
+            rules = pickle.load(f)
+        df = pd.read_csv(dataset_path)
+        rule_store = load_rule_store(rules)
+
+    # Table de réponses précalculées (optionnelle), construite par answer_table.py
+    # Activée avec ANSWER_TABLE=chemin/vers/answer_table.json.gz
+    answer_table = None
+    answer_table_path = os.environ.get("ANSWER_TABLE")
+    if answer_table_path:
+        try:
+            answer_table = load_answer_table(answer_table_path, rules_path, dataset_path)
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Table de réponses ignorée : {e}")
+
+    return {
+        # Version du jeu de règles : empreintes de rules.pkl et du dataset
+        'version': f"{version['rules_sha256'][:12]}-{version['dataset_sha256'][:12]}",
+        'rules': rules,
+        'df': df,
+        'rule_store': rule_store,
+        'year_table': build_year_period_table(df),
+        'answer_table': answer_table,
+        # Cache LRU des sélections déjà calculées (PREDICT_CACHE_SIZE entrées, PREDICT_CACHE_MB Mo)
+        'cache': SelectionCache(
+            max_entries=int(os.environ.get("PREDICT_CACHE_SIZE", 1024)),
+            max_bytes=int(os.environ.get("PREDICT_CACHE_MB", 64)) * 1024 * 1024
+        ),
+        'source_mtimes': source_mtimes,
+    }
+
+def _source_mtimes():
+    # Fichier absent : None (un déploiement peut ne livrer que le bundle)
+    paths = (rules_path, dataset_path, os.path.join(shared_data_dir, 'manifest.json'))
+    return tuple(os.path.getmtime(path) if os.path.exists(path) else None for path in paths)
+
+_snapshot = load_snapshot()
+
+# Latences par étape du moteur, exposées sur /metrics (PREDICT_METRICS=0 pour couper).
+# Hors snapshot : les compteurs survivent aux rechargements.
+# Avec METRICS_DIR (posé par gunicorn.conf.py), chaque worker tient ses compteurs dans
+# METRICS_DIR/stage_metrics_<pid>.npy et /metrics renvoie la somme de tous les workers,
+# quel que soit celui qui répond. Sans METRICS_DIR : compteurs du seul processus.
+METRICS_ENABLED = os.environ.get("PREDICT_METRICS", "1") == "1"
+metrics_dir = os.environ.get("METRICS_DIR")
+_stage_metrics = None
+_stage_metrics_pid = None
+_stage_metrics_lock = threading.Lock()
+
+def current_stage_metrics():
+    """StageMetrics du processus courant, créé dans chaque worker après le fork."""
+    global _stage_metrics, _stage_metrics_pid
+    if not METRICS_ENABLED:
+        return None
+    if _stage_metrics_pid != os.getpid():
+        with _stage_metrics_lock:
+            if _stage_metrics_pid != os.getpid():
+                path = None
+                if metrics_dir:
+                    os.makedirs(metrics_dir, exist_ok=True)
+                    path = os.path.join(metrics_dir, f"stage_metrics_{os.getpid()}.npy")
+                _stage_metrics = StageMetrics(path=path)
+                _stage_metrics_pid = os.getpid()
+    return _stage_metrics
+
+_reload_lock = threading.Lock()
+_reload_status = {'state': 'idle', 'error': None}
+
+def current_snapshot():
+    """Snapshot à utiliser pour toute la durée d'une requête."""
+    _ensure_source_watcher()
+    return _snapshot
+
+def reload_snapshot():
+    """
+    Reconstruit un snapshot complet puis remplace la référence courante
+    (affectation atomique). En cas d'échec, l'ancien snapshot reste servi.
+    Renvoie False si un rechargement est déjà en cours.
+    """
+    global _snapshot
+    if not _reload_lock.acquire(blocking=False):
+        return False
+    try:
+        _reload_status['state'] = 'reloading'
+        new_snapshot = load_snapshot()
+        _snapshot = new_snapshot
+        _reload_status.update(state='idle', error=None)
+        app.logger.info("Règles rechargées : version %s", new_snapshot['version'])
+    except Exception as e:
+        _reload_status.update(state='failed', error=str(e))
+        app.logger.error("Rechargement impossible, version %s conservée : %s", _snapshot['version'], e)
+    finally:
+        _reload_lock.release()
+    return True
+
+def _watch_sources(interval):
+    """Recharge en arrière-plan dès que rules.pkl ou le dataset change sur disque."""
+    while True:
+        time.sleep(interval)
+        try:
+            changed = _source_mtimes() != _snapshot['source_mtimes']
+        except OSError:
+            continue
+        if changed:
+            reload_snapshot()
+
+# Surveillance optionnelle des fichiers : RELOAD_WATCH_SECONDS=intervalle.
+# Démarrée dans le processus qui sert les requêtes (chaque worker gunicorn,
+# y compris avec preload_app où le maître charge l'application sans servir).
+_watcher_pid = None
+
+def _ensure_source_watcher():
+    global _watcher_pid
+    interval = os.environ.get("RELOAD_WATCH_SECONDS")
+    if interval and _watcher_pid != os.getpid():
+        _watcher_pid = os.getpid()
+        threading.Thread(target=_watch_sources, args=(float(interval),), daemon=True).start()
+
+def _selection_from_payload(data):
+    return {
+        "years": data.get("years"),
+        "mass": data.get("mass"),
+        "continents": data.get("continents")
+    }
+
+def predict_selection(sel, snapshot=None):
+    """Réponse /predict d'une sélection (table précalculée, sinon moteur + cache)."""
+    snap = snapshot or current_snapshot()
+
+    # Sélection catégorielle précalculée : réponse directe
+    if snap['answer_table'] is not None:
+        cached = lookup_answer(snap['answer_table'], sel, snap['year_table'])
+        if cached is not None:
+            return dict(cached, rules_version=snap['version'])
+
+    result = cached_process_user_selection(sel, snap['rules'], snap['df'], snap['cache'],
+                                           store=snap['rule_store'], year_table=snap['year_table'],
+                                           metrics=current_stage_metrics())
+    return dict(format_prediction_response(result), rules_version=snap['version'])
+
+# Profilage à la demande ({"debug": true} ou ?debug=1 sur /predict), activé
+# seulement avec PREDICT_PROFILING=1. Un seul profil à la fois par processus.
+PROFILING_ENABLED = os.environ.get("PREDICT_PROFILING") == "1"
+PROFILE_TOP_N = int(os.environ.get("PROFILE_TOP_N", 15))
+_profile_lock = threading.Lock()
+
+class RequestError(Exception):
+    """Requête refusée avec un statut HTTP précis (profilage, pagination)."""
+
+    def __init__(self, message, status):
+        super().__init__(message)
+        self.status = status
+
+def profile_selection(sel, snapshot=None):
+    """
+    Réponse /predict calculée par le moteur sous profileur (table
+    précalculée et cache ignorés), avec le champ "profile" en plus.
+    """
+    if not PROFILING_ENABLED:
+        raise RequestError("profilage désactivé (PREDICT_PROFILING=1 pour l'activer)", 403)
+    if not _profile_lock.acquire(blocking=False):
+        raise RequestError("un profilage est déjà en cours, réessayer plus tard", 429)
+    snap = snapshot or current_snapshot()
+    try:
+        result, profile = profile_user_selection(sel, snap['rules'], snap['df'], store=snap['rule_store'],
+                                                 year_table=snap['year_table'], top_n=PROFILE_TOP_N)
+    finally:
+        _profile_lock.release()
+    return dict(format_prediction_response(result), rules_version=snap['version'], profile=profile)
+
+def _wants_profile(data, args):
+    return bool(data.get("debug")) or args.get("debug") in ("1", "true")
+
+# Pagination de names / sample_years : {"page_size": n} (et "sample_seed" pour un
+# échantillon aléatoire reproductible) pour la première page, puis {"cursor": ...}
+# avec la même sélection. Le curseur est lié à la version des règles.
+MAX_PAGE_SIZE = int(os.environ.get("MAX_PAGE_SIZE", 1000))
+PAGE_KEYS = ("cursor", "page_size", "sample_seed")
+
+def _selection_digest(sel):
+    return hashlib.sha256(json.dumps(sel, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+def _encode_cursor(state):
+    return base64.urlsafe_b64encode(json.dumps(state).encode()).decode()
+
+def _decode_cursor(cursor):
+    try:
+        state = json.loads(base64.urlsafe_b64decode(str(cursor).encode()))
+        offset = int(state['o'])
+        decoded = offset, int(state['n']), state.get('seed'), state['v'], state['s']
+    except (ValueError, TypeError, KeyError, binascii.Error):
+        raise RequestError("curseur invalide", 400)
+    # Curseur non signé : un offset négatif renverrait la fin des listes
+    if offset < 0:
+        raise RequestError("curseur invalide", 400)
+    return decoded
+
+def paginated_selection(sel, data, snapshot=None):
+    """
+    Page de names / sample_years calculée par le moteur (sans cache), avec
+    les totaux exacts et next_cursor (None à la dernière page).
+    """
+    snap = snapshot or current_snapshot()
+    digest = _selection_digest(sel)
+    if data.get("cursor"):
+        offset, limit, seed, version, cursor_digest = _decode_cursor(data["cursor"])
+        if version != snap['version']:
+            raise RequestError("curseur expiré : les règles ont été rechargées", 410)
+        if cursor_digest != digest:
+            raise RequestError("le curseur correspond à une autre sélection", 400)
+    else:
+        offset, limit, seed = 0, data.get("page_size", DEFAULT_PAGE_SIZE), data.get("sample_seed")
+    # bool est un int en Python : true ne vaut pas page_size=1
+    if not isinstance(limit, int) or isinstance(limit, bool) or not 1 <= limit <= MAX_PAGE_SIZE:
+        raise RequestError(f"page_size doit être un entier entre 1 et {MAX_PAGE_SIZE}", 400)
+    # np.random.default_rng refuse les graines négatives (erreur 500 sinon)
+    if seed is not None and (not isinstance(seed, int) or isinstance(seed, bool) or seed < 0):
+        raise RequestError("sample_seed doit être un entier positif ou nul", 400)
+
+    result = process_user_selection(sel, snap['rules'], snap['df'], store=snap['rule_store'],
+                                    year_table=snap['year_table'], metrics=current_stage_metrics(),
+                                    page={'offset': offset, 'limit': limit, 'sample_seed': seed})
+    end = offset + limit
+    more = end < max(result['names_total'], result['sample_years_total'])
+    next_cursor = _encode_cursor({'o': end, 'n': limit, 'seed': seed, 'v': snap['version'], 's': digest})
+    return dict(format_prediction_response(result), rules_version=snap['version'],
+                next_cursor=next_cursor if more else None)
+
+def predict_payload(data, args, snapshot=None):
+    """Réponse /predict d'un corps JSON : profilage, page demandée ou réponse standard."""
+    sel = _selection_from_payload(data)
+    if _wants_profile(data, args):
+        return profile_selection(sel, snapshot)
+    if any(key in data for key in PAGE_KEYS):
+        return paginated_selection(sel, data, snapshot)
+    return predict_selection(sel, snapshot)
+
+def json_response(payload, status=200):
+    """Réponse JSON (sérialiseur rapide, compression négociée avec le client)."""
+    body, encoding = compress(dumps(payload), request.headers.get("Accept-Encoding"))
+    response = Response(body, status=status, mimetype="application/json")
+    response.headers["Vary"] = "Accept-Encoding"
+    if encoding:
+        response.headers["Content-Encoding"] = encoding
+    return response
+
+def _with_version(response, snap):
+    response.headers["X-Rules-Version"] = snap['version']
+    return response
 
 @app.route("/predict", methods=["POST"])
 def predict():
+    snap = current_snapshot()
     try:
         data = request.get_json(force=True)
-        sel = {
-            "years": data.get("years"),
-            "mass": data.get("mass"),
-            "continents": data.get("continents")
-        }
-        result = process_user_selection(sel, rules, df)
-        
-        # Construire la réponse de base
-        response = {
-            "top_type": result["top_type"],
-            "probability": result["probability"],
-            "names": result["names"],
-            "countries": result["countries"],
-            "sample_years": result["sample_years"]
-        }
-        
-        # N'ajouter les prédictions que si elles existent
-        if "predicted_years" in result:
-            response["predicted_years"] = result["predicted_years"]
-        if "predicted_mass" in result:
-            response["predicted_mass"] = result["predicted_mass"]
-        if "predicted_continent" in result:
-            response["predicted_continent"] = result["predicted_continent"]
-        
-        return jsonify(response)
+        return _with_version(json_response(predict_payload(data, request.args, snap)), snap)
+    except RequestError as e:
+        return _with_version(json_response({"error": str(e), "rules_version": snap['version']}, e.status), snap)
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
+        return _with_version(json_response({"error": str(e), "rules_version": snap['version']}, 500), snap)
+
+def _predict_many(sels, snap):
+    """Réponses /predict d'une liste de sélections (table précalculée puis moteur en lot)."""
+    responses = [None] * len(sels)
+    pending, positions = [], []
+    for i, sel in enumerate(sels):
+        cached = None
+        if snap['answer_table'] is not None:
+            cached = lookup_answer(snap['answer_table'], sel, snap['year_table'])
+        if cached is not None:
+            responses[i] = cached
+        else:
+            pending.append(sel)
+            positions.append(i)
+
+    results = process_user_selections(pending, snap['rules'], snap['df'], snap['rule_store'],
+                                      snap['year_table'], snap['cache'], current_stage_metrics())
+    for i, result in zip(positions, results):
+        if isinstance(result, Exception):
+            responses[i] = {"error": str(result)}
+        else:
+            responses[i] = format_prediction_response(result)
+    return responses
+
+@app.route("/predict/batch", methods=["POST"])
+def predict_batch():
+    """
+    Corps : liste de sélections (ou {"selections": [...]}) au format /predict.
+    Réponse : {"results": [...], "rules_version": ...} dans le même ordre,
+    chaque élément identique à la réponse de /predict pour cette sélection
+    (rules_version compris). Un seul snapshot sert tout le lot : une même
+    réponse ne mélange jamais deux versions de règles, même pendant un
+    rechargement.
+    """
+    snap = current_snapshot()
+    try:
+        data = request.get_json(force=True)
+        payloads = data.get("selections") if isinstance(data, dict) else data
+        if not isinstance(payloads, list):
+            return _with_version(json_response({"error": "une liste de sélections est attendue"}, 400), snap)
+
+        version = snap['version']
+        responses = [{"error": "sélection invalide", "rules_version": version}] * len(payloads)
+        sels, positions = [], []
+        for i, payload in enumerate(payloads):
+            if isinstance(payload, dict):
+                sels.append(_selection_from_payload(payload))
+                positions.append(i)
+        for i, response in zip(positions, _predict_many(sels, snap)):
+            responses[i] = dict(response, rules_version=version)
+
+        return _with_version(json_response({"results": responses, "rules_version": version}), snap)
+    except Exception as e:
+        return _with_version(json_response({"error": str(e), "rules_version": snap['version']}, 500), snap)
+
+@app.route("/predict/stream", methods=["POST"])
+def predict_stream():
+    """
+    Corps : une sélection JSON par ligne (NDJSON), de taille quelconque.
+    Réponse : une ligne JSON par sélection, produite au fil de la lecture
+    par paquets de ?chunk_size= lignes (1000 par défaut). Tout le flux est
+    servi par la même version de règles (en-tête X-Rules-Version).
+    """
+    snap = current_snapshot()
+    # Vérifié avant la réponse : une fois le flux commencé, plus d'erreur possible
+    try:
+        chunk_size = int(request.args.get("chunk_size", 1000))
+    except ValueError:
+        chunk_size = 0
+    if chunk_size < 1:
+        return _with_version(json_response({"error": "chunk_size doit être un entier ≥ 1",
+                                             "rules_version": snap['version']}, 400), snap)
+    stats = {}
+    # Même sérialiseur que les réponses JSON (serialization.dumps)
+    blocks = score_ndjson(request.stream, lambda sels: _predict_many(sels, snap), chunk_size, stats, dumps)
+
+    def generate():
+        yield from blocks
+        app.logger.info("Flux NDJSON : %d lignes, %.0f lignes/s, pic RSS %.0f Mo",
+                        stats['rows'], stats['rows'] / max(stats['seconds'], 1e-9), peak_rss_mb() or 0)
+
+    return _with_version(Response(stream_with_context(generate()), mimetype="application/x-ndjson"), snap)
+
+# -----------------------------
+# Métriques (format texte Prometheus)
+# -----------------------------
+def render_metrics(snap):
+    """
+    Histogrammes par étape du moteur (tous workers confondus avec METRICS_DIR)
+    + compteurs du cache de la version servie. Le cache est propre à chaque
+    worker : ses séries portent le label worker (pid), seul le worker qui
+    répond apparaît.
+    """
+    stage_metrics = current_stage_metrics()
+    if stage_metrics is None:
+        text = ""
+    elif stage_metrics.path is not None:
+        text = stage_metrics.render_prometheus(snap=merge_stage_metrics(stage_metrics, metrics_dir))
+    else:
+        text = stage_metrics.render_prometheus()
+    cache = snap['cache'].stats()
+    lines = []
+    for name, kind in (('hits', 'counter'), ('misses', 'counter'), ('evictions', 'counter'),
+                       ('entries', 'gauge'), ('bytes', 'gauge')):
+        metric = f"meteorite_cache_{name}" + ("_total" if kind == 'counter' else "")
+        lines += [f"# TYPE {metric} {kind}", f'{metric}{{worker="{os.getpid()}"}} {cache[name]}']
+    lines.append(f'meteorite_rules_info{{version="{snap["version"]}"}} 1')
+    return text + "\n".join(lines) + "\n"
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    return Response(render_metrics(current_snapshot()), mimetype="text/plain; version=0.0.4")
+
+# -----------------------------
+# Administration : version et rechargement à chaud
+# -----------------------------
+def _is_admin():
+    token = os.environ.get("ADMIN_TOKEN")
+    return bool(token) and hmac.compare_digest(request.headers.get("X-Admin-Token", ""), token)
+
+@app.route("/admin/version", methods=["GET"])
+def admin_version():
+    return json_response({"rules_version": _snapshot['version'], "reload": dict(_reload_status)})
+
+@app.route("/admin/reload", methods=["POST"])
+def admin_reload():
+    """Lance la reconstruction du snapshot en arrière-plan (en-tête X-Admin-Token = ADMIN_TOKEN)."""
+    if not _is_admin():
+        return json_response({"error": "accès refusé"}, 403)
+    if _reload_lock.locked():
+        return json_response({"status": "already reloading", "rules_version": _snapshot['version']}, 409)
+    threading.Thread(target=reload_snapshot, daemon=True).start()
+    return json_response({"status": "reloading", "rules_version": _snapshot['version']}, 202)
 
 if __name__ == "__main__":
-    app.run(debug=True, host="0.0.0.0", port=5001)
\ No newline at end of file
+    # HTTP/1.1 : connexions keep-alive avec le serveur de développement
+    from werkzeug.serving import WSGIRequestHandler
+    WSGIRequestHandler.protocol_version = "HTTP/1.1"
+    app.run(debug=True, host="0.0.0.0", port=5001)
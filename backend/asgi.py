@@ -0,0 +1,133 @@
+# asgi.py
+"""
+Point d'entrée ASGI du backend de prédiction, même contrat que /predict
+de app.py (mêmes données, même moteur, même table et même cache).
+
+    uvicorn asgi:app --host 0.0.0.0 --port 5001
+
+Le calcul (CPU) de chaque prédiction est déporté dans un pool de threads
+borné ; la boucle asyncio reste libre pour accepter les connexions.
+Configuration par variables d'environnement :
+    ASGI_THREADS          taille du pool de calcul (défaut : nombre de CPU)
+    ASGI_MAX_CONCURRENCY  prédictions admises simultanément (défaut : 64)
+    ASGI_QUEUE_TIMEOUT    attente max d'une place, en secondes (défaut : 10),
+                          au-delà la requête reçoit 503
+GET /metrics : mêmes métriques que app.py (format texte Prometheus).
+Profilage ({"debug": true}) et pagination ("page_size", "cursor") : comme app.py.
+"""
+import asyncio
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl
+
+import app as serving
+from serialization import dumps, compress
+
+THREADS = int(os.environ.get("ASGI_THREADS", os.cpu_count() or 4))
+MAX_CONCURRENCY = int(os.environ.get("ASGI_MAX_CONCURRENCY", 64))
+QUEUE_TIMEOUT = float(os.environ.get("ASGI_QUEUE_TIMEOUT", 10))
+
+_executor = ThreadPoolExecutor(max_workers=THREADS, thread_name_prefix="predict")
+_slots = None  # asyncio.Semaphore, créé dans la boucle du serveur
+
+CORS_HEADERS = [
+    (b"access-control-allow-origin", b"*"),
+    (b"access-control-allow-headers", b"content-type"),
+    (b"access-control-allow-methods", b"POST, OPTIONS"),
+]
+
+
+async def _read_body(receive):
+    chunks = []
+    while True:
+        message = await receive()
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body", False):
+            return b"".join(chunks)
+
+
+def _accept_encoding(scope):
+    for name, value in scope.get("headers", []):
+        if name == b"accept-encoding":
+            return value.decode("latin-1")
+    return None
+
+
+async def _send_json(send, status, payload, extra_headers=(), accept_encoding=None):
+    body, encoding = compress(dumps(payload), accept_encoding)
+    headers = [(b"content-type", b"application/json"),
+               (b"content-length", str(len(body)).encode()),
+               (b"vary", b"accept-encoding")]
+    if encoding:
+        headers.append((b"content-encoding", encoding.encode()))
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": headers + CORS_HEADERS + list(extra_headers),
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+def _predict(body, query, snapshot):
+    return serving.predict_payload(json.loads(body), query, snapshot)
+
+
+async def _handle_predict(scope, receive, send):
+    global _slots
+    if _slots is None:
+        _slots = asyncio.Semaphore(MAX_CONCURRENCY)
+
+    body = await _read_body(receive)
+    try:
+        await asyncio.wait_for(_slots.acquire(), QUEUE_TIMEOUT)
+    except asyncio.TimeoutError:
+        await _send_json(send, 503, {"error": "serveur saturé, réessayer plus tard"})
+        return
+
+    # Snapshot lu une fois : la requête finit sur cette version même si un rechargement a lieu
+    snapshot = serving.current_snapshot()
+    version_header = [(b"x-rules-version", snapshot['version'].encode())]
+    try:
+        loop = asyncio.get_running_loop()
+        query = dict(parse_qsl(scope.get("query_string", b"").decode("latin-1")))
+        response = await loop.run_in_executor(_executor, _predict, body, query, snapshot)
+    except serving.RequestError as e:
+        await _send_json(send, e.status, {"error": str(e), "rules_version": snapshot['version']}, version_header)
+        return
+    except Exception as e:
+        await _send_json(send, 500, {"error": str(e), "rules_version": snapshot['version']}, version_header)
+        return
+    finally:
+        _slots.release()
+
+    await _send_json(send, 200, response, version_header, _accept_encoding(scope))
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                _executor.shutdown(wait=False)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    if scope["type"] != "http":
+        return
+
+    if scope["path"] == "/metrics" and scope["method"] == "GET":
+        body = serving.render_metrics(serving.current_snapshot()).encode("utf-8")
+        await send({"type": "http.response.start", "status": 200,
+                    "headers": [(b"content-type", b"text/plain; version=0.0.4; charset=utf-8"),
+                                (b"content-length", str(len(body)).encode())]})
+        await send({"type": "http.response.body", "body": body})
+    elif scope["path"] == "/predict" and scope["method"] == "POST":
+        await _handle_predict(scope, receive, send)
+    elif scope["path"] == "/predict" and scope["method"] == "OPTIONS":
+        await send({"type": "http.response.start", "status": 204, "headers": CORS_HEADERS})
+        await send({"type": "http.response.body", "body": b""})
+    else:
+        await _send_json(send, 404, {"error": "not found"})
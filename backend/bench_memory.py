@@ -0,0 +1,116 @@
+# bench_memory.py
+"""
+Mémoire par worker gunicorn, avant / après la disposition partagée :
+- avant : chaque worker charge lui-même le CSV et rules.pkl (sans preload,
+  SHARED_DATA_DIR pointé vers un répertoire vide) ;
+- après : preload_app + données mappées (SHARED_DATA_DIR, voir shared_store.py).
+
+    python bench_memory.py --workers 4
+
+Pour chaque worker : RSS, PSS (mémoire partagée répartie entre processus)
+et USS (mémoire privée), après démarrage puis après des requêtes /predict.
+Linux uniquement (/proc/<pid>/smaps_rollup).
+"""
+import argparse
+import json
+import os
+import pickle
+import tempfile
+from urllib.parse import urlsplit
+
+import pandas as pd
+
+from server_harness import SELECTIONS, post_selection, running_server
+from shared_store import (export_shared_data, shared_data_version, source_stamps,
+                          DEFAULT_DATASET_PATH, DEFAULT_RULES_PATH)
+
+
+def _children(pid):
+    children = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+        except OSError:
+            continue
+        if int(fields[1]) == pid:
+            children.append(int(entry))
+    return sorted(children)
+
+
+def _memory_mb(pid):
+    usage = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 2 and parts[0].endswith(":") and parts[1].isdigit():
+                usage[parts[0][:-1]] = int(parts[1])
+    return {
+        "rss_mb": usage.get("Rss", 0) / 1024,
+        "pss_mb": usage.get("Pss", 0) / 1024,
+        "uss_mb": (usage.get("Private_Clean", 0) + usage.get("Private_Dirty", 0)) / 1024,
+    }
+
+
+def measure(layout, n_workers, n_requests, shared_dir):
+    env = {"PREDICT_CACHE_SIZE": "0"}
+    if layout == "avant":
+        env["GUNICORN_PRELOAD"] = "0"
+        env["SHARED_DATA_DIR"] = os.path.join(shared_dir, "absent")
+    else:
+        env["GUNICORN_PRELOAD"] = "1"
+        env["SHARED_DATA_DIR"] = shared_dir
+
+    def ready(process):
+        # Prêt quand tous les workers sont lancés
+        return len(_children(process.pid)) >= n_workers
+
+    with running_server("gunicorn", n_workers, env, ready) as (url, process):
+        port = urlsplit(url).port
+        workers = _children(process.pid)
+        started = {pid: _memory_mb(pid) for pid in workers}
+        for i in range(n_requests):
+            post_selection(port, SELECTIONS[i % len(SELECTIONS)])
+        loaded = {pid: _memory_mb(pid) for pid in workers}
+        return {"workers": [{"pid": pid, "start": started[pid], "after_requests": loaded[pid]}
+                            for pid in workers]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mémoire par worker gunicorn avant/après partage")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--rules", default=DEFAULT_RULES_PATH)
+    parser.add_argument("--dataset", default=DEFAULT_DATASET_PATH)
+    parser.add_argument("--output", help="fichier JSON du rapport")
+    args = parser.parse_args()
+
+    report = {}
+    with tempfile.TemporaryDirectory() as shared_dir:
+        df = pd.read_csv(args.dataset)
+        with open(args.rules, "rb") as f:
+            rules = pickle.load(f)
+        export_shared_data(df, rules, shared_dir, shared_data_version(args.rules, args.dataset),
+                           source_stamps(args.rules, args.dataset))
+        del df, rules
+
+        for layout in ("avant", "après"):
+            report[layout] = measure(layout, args.workers, args.requests, shared_dir)
+            print(f"\n{layout} ({args.workers} workers)")
+            for worker in report[layout]["workers"]:
+                for phase in ("start", "after_requests"):
+                    m = worker[phase]
+                    print(f"  pid {worker['pid']:<7d} {phase:15s} RSS {m['rss_mb']:6.1f} Mo  "
+                          f"PSS {m['pss_mb']:6.1f} Mo  USS {m['uss_mb']:6.1f} Mo")
+            total_pss = sum(w["after_requests"]["pss_mb"] for w in report[layout]["workers"])
+            print(f"  total PSS des workers : {total_pss:.1f} Mo")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+# bench_serialization.py
+"""
+Gain de la sérialisation rapide et de la compression sur une grosse
+réponse /predict/batch (--selections sélections réparties sur la grille
+d'answer_table.py).
+
+    python bench_serialization.py
+    python bench_serialization.py --bandwidth-mbps 5 --rtt-ms 80 --output serialisation.json
+
+Pour chaque sérialiseur (jsonify de Flask, json, orjson) et chaque
+encodage (aucun, gzip, br) : temps de sérialisation + compression côté
+serveur, taille transmise, temps de transfert estimé au débit donné,
+et temps de décodage côté client. Mesure aussi un tableau NumPy
+(orjson natif contre conversion tolist()). Puis la requête complète
+/predict/batch dans le client de test Flask, avec ces mêmes réglages.
+"""
+import argparse
+import gzip
+import json
+import time
+
+import numpy as np
+
+import app as serving
+import serialization
+from answer_table import selection_grid
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+def best_time(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def serializers():
+    flask_json = serving.app.json
+    candidates = {"flask_jsonify": lambda obj: flask_json.dumps(obj).encode("utf-8")}
+    candidates.update(serialization.SERIALIZERS)
+    return candidates
+
+
+def encoders():
+    candidates = {"identity": (lambda body: body, lambda body: body)}
+    candidates["gzip"] = (lambda body: gzip.compress(body, serialization.GZIP_LEVEL, mtime=0), gzip.decompress)
+    if brotli is not None:
+        candidates["br"] = (lambda body: brotli.compress(body, quality=serialization.BROTLI_QUALITY),
+                            brotli.decompress)
+    return candidates
+
+
+def bench_payload(payload, bandwidth_mbps, rtt_ms, repeat):
+    rows = []
+    for name, dumps in serializers().items():
+        body = dumps(payload)
+        serialize_s = best_time(lambda: dumps(payload), repeat)
+        for encoding, (encode, decode) in encoders().items():
+            sent = encode(body)
+            encode_s = best_time(lambda: encode(body), repeat)
+            decode_s = best_time(lambda: json.loads(decode(sent)), repeat)
+            transfer_s = len(sent) * 8 / (bandwidth_mbps * 1e6) + rtt_ms / 1000
+            rows.append({
+                "serializer": name,
+                "encoding": encoding,
+                "raw_bytes": len(body),
+                "sent_bytes": len(sent),
+                "serialize_ms": serialize_s * 1000,
+                "compress_ms": encode_s * 1000,
+                "transfer_ms": transfer_s * 1000,
+                "client_decode_ms": decode_s * 1000,
+                "total_ms": (serialize_s + encode_s + transfer_s + decode_s) * 1000,
+            })
+    return rows
+
+
+def bench_numpy(size, repeat):
+    values = np.random.default_rng(0).random(size)
+    payload = {"values": values}
+    rows = {"json_tolist_ms": best_time(lambda: serialization._dumps_json(payload), repeat) * 1000}
+    if serialization.orjson is not None:
+        rows["orjson_native_ms"] = best_time(lambda: serialization._dumps_orjson(payload), repeat) * 1000
+    return rows
+
+
+def bench_endpoint(body, repeat):
+    """Requête /predict/batch complète (client de test Flask), par sérialiseur et encodage."""
+    client = serving.app.test_client()
+    rows = []
+    default = serialization.SERIALIZER
+    try:
+        for name in serialization.SERIALIZERS:
+            serialization.SERIALIZER = name
+            for encoding in ["identity", "gzip"] + (["br"] if brotli is not None else []):
+                headers = {"Accept-Encoding": encoding}
+
+                def call():
+                    response = client.post("/predict/batch", data=body, headers=headers,
+                                           content_type="application/json")
+                    assert response.status_code == 200
+                    return response
+
+                response = call()
+                rows.append({
+                    "serializer": name,
+                    "encoding": response.headers.get("Content-Encoding", "identity"),
+                    "sent_bytes": len(response.data),
+                    "server_ms": best_time(call, repeat) * 1000,
+                })
+    finally:
+        serialization.SERIALIZER = default
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sérialisation et compression des réponses batch")
+    parser.add_argument("--bandwidth-mbps", type=float, default=10.0, help="débit client ↔ serveur")
+    parser.add_argument("--rtt-ms", type=float, default=50.0)
+    parser.add_argument("--selections", type=int, default=500, help="taille de la réponse batch")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--numpy-size", type=int, default=100_000)
+    parser.add_argument("--output", help="fichier JSON des résultats")
+    args = parser.parse_args()
+
+    snap = serving.current_snapshot()
+    grid = list(selection_grid(snap['df']))
+    step = max(1, len(grid) // args.selections)
+    sels = [serving._selection_from_payload(sel) for sel in grid[::step][:args.selections]]
+    payload = {"results": serving._predict_many(sels, snap), "rules_version": snap['version']}
+    print(f"Réponse batch : {len(sels)} sélections")
+
+    report = {
+        "selections": len(sels),
+        "bandwidth_mbps": args.bandwidth_mbps,
+        "rtt_ms": args.rtt_ms,
+        "payload": bench_payload(payload, args.bandwidth_mbps, args.rtt_ms, args.repeat),
+        "numpy": bench_numpy(args.numpy_size, args.repeat),
+        "endpoint": bench_endpoint(json.dumps(sels), args.repeat),
+    }
+
+    baseline = next(row for row in report["payload"]
+                    if row["serializer"] == "flask_jsonify" and row["encoding"] == "identity")
+    for row in report["payload"]:
+        print(f"{row['serializer']:14s} {row['encoding']:9s} {row['sent_bytes']:>9d} o  "
+              f"sérialisation {row['serialize_ms']:6.1f} ms  compression {row['compress_ms']:6.1f} ms  "
+              f"transfert {row['transfer_ms']:7.1f} ms  décodage {row['client_decode_ms']:5.1f} ms  "
+              f"total {row['total_ms']:7.1f} ms ({row['total_ms'] - baseline['total_ms']:+.1f})")
+    print(f"NumPy ({args.numpy_size} flottants) : " +
+          ", ".join(f"{name} {ms:.1f} ms" for name, ms in report["numpy"].items()))
+    for row in report["endpoint"]:
+        print(f"/predict/batch {row['serializer']:7s} {row['encoding']:9s} {row['sent_bytes']:>9d} o  "
+              f"{row['server_ms']:7.1f} ms")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+# bench_serving.py
+"""
+Compare le serveur Flask (app.py) et le point d'entrée ASGI (asgi.py)
+à 1, 16 et 128 clients simultanés sur le même mélange de sélections.
+
+    python bench_serving.py                       # 600 requêtes par palier
+    python bench_serving.py --requests 2000 --concurrency 1 16 128
+
+Chaque serveur est lancé en sous-processus sur un port libre (voir
+server_harness.py), cache LRU désactivé (PREDICT_CACHE_SIZE=0) pour
+mesurer le moteur à chaque requête.
+"""
+import argparse
+import http.client
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+import numpy as np
+
+from server_harness import SELECTIONS, running_server
+
+# Serveurs comparés (table complète : server_harness.SERVERS)
+SERVERS = ["flask", "asgi"]
+
+
+def _post(port, body):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    try:
+        start = time.perf_counter()
+        conn.request("POST", "/predict", body, {"Content-Type": "application/json"})
+        response = conn.getresponse()
+        response.read()
+        return time.perf_counter() - start, response.status
+    finally:
+        conn.close()
+
+
+def run_level(port, n_requests, concurrency):
+    bodies = [json.dumps(SELECTIONS[i % len(SELECTIONS)]) for i in range(n_requests)]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(lambda body: _post(port, body), bodies))
+    elapsed = time.perf_counter() - start
+
+    latencies = np.array([r[0] for r in results]) * 1000
+    errors = sum(1 for r in results if r[1] != 200)
+    return {
+        "concurrency": concurrency,
+        "requests": n_requests,
+        "throughput_rps": n_requests / elapsed,
+        "errors": errors,
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p95_ms": float(np.percentile(latencies, 95)),
+        "p99_ms": float(np.percentile(latencies, 99)),
+    }
+
+
+def bench_server(name, n_requests, levels):
+    with running_server(name, env={"PREDICT_CACHE_SIZE": "0"}) as (url, _):
+        port = urlsplit(url).port
+        return [run_level(port, n_requests, c) for c in levels]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Flask vs ASGI sur /predict")
+    parser.add_argument("--requests", type=int, default=600)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 16, 128])
+    parser.add_argument("--servers", nargs="+", default=SERVERS, choices=SERVERS)
+    parser.add_argument("--output", help="fichier JSON des résultats")
+    args = parser.parse_args()
+
+    report = {}
+    for name in args.servers:
+        report[name] = bench_server(name, args.requests, args.concurrency)
+        for level in report[name]:
+            print(f"{name:6s} c={level['concurrency']:<4d} {level['throughput_rps']:8.1f} req/s  "
+                  f"p50 {level['p50_ms']:7.1f} ms  p95 {level['p95_ms']:7.1f} ms  "
+                  f"p99 {level['p99_ms']:7.1f} ms  erreurs {level['errors']}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+# bench_startup.py
+"""
+Coût d'import du chemin de service, mesuré avec `python -X importtime`.
+
+    python bench_startup.py                   # import app (Flask) et asgi
+    python bench_startup.py --budget-ms 800   # échoue au-delà de 800 ms
+    python bench_startup.py --output startup.json
+
+Chaque module est importé dans un interpréteur neuf (moyenne de --runs
+lancements). Le temps de `import app` inclut le chargement du snapshot
+(bundle ou rules.pkl + CSV). Code de sortie 1 si un module interdit
+(folium, mlxtend, scipy...) est chargé au démarrage ou si le budget est
+dépassé : de quoi repérer une régression.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+ENTRY_POINTS = ["app", "asgi"]
+
+# Inutiles pour servir /predict : ne doivent jamais être importés au démarrage
+FORBIDDEN = ["folium", "mlxtend", "scipy", "sklearn", "matplotlib"]
+
+
+def import_times(module):
+    """Temps d'import par module de premier niveau (µs cumulés, self inclus)."""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            cwd=BACKEND_DIR, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} impossible :\n{result.stderr[-2000:]}")
+
+    packages = {}
+    total = 0
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        # "import time:  self | cumulative | <indentation>module"
+        self_part, cumulative_us, name = line[len("import time:"):].split("|")
+        top = name.strip().split(".")[0]
+        packages[top] = packages.get(top, 0) + int(self_part)
+        # Modules de niveau 0 (non indentés) : leur cumul couvre tout l'import
+        if not name[1:].startswith(" "):
+            total += int(cumulative_us)
+    return total, packages
+
+
+def measure(module, runs):
+    totals, packages = [], {}
+    for _ in range(runs):
+        total, run_packages = import_times(module)
+        totals.append(total)
+        for name, us in run_packages.items():
+            packages[name] = packages.get(name, 0) + us / runs
+    return {
+        "module": module,
+        "total_ms": sum(totals) / runs / 1000,
+        "packages_ms": {name: us / 1000 for name, us in
+                        sorted(packages.items(), key=lambda item: -item[1])},
+        "forbidden": sorted(name for name in FORBIDDEN if name in packages),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Temps d'import du chemin de service")
+    parser.add_argument("--modules", nargs="+", default=ENTRY_POINTS)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--top", type=int, default=10, help="paquets les plus coûteux à afficher")
+    parser.add_argument("--budget-ms", type=float, help="échec si un import dépasse ce temps")
+    parser.add_argument("--output", help="fichier JSON du rapport")
+    args = parser.parse_args()
+
+    report = [measure(module, args.runs) for module in args.modules]
+    failed = False
+    for entry in report:
+        print(f"import {entry['module']} : {entry['total_ms']:.0f} ms")
+        for name, ms in list(entry["packages_ms"].items())[:args.top]:
+            print(f"  {name:24s} {ms:8.1f} ms")
+        if entry["forbidden"]:
+            print(f"  ❌ modules interdits chargés : {', '.join(entry['forbidden'])}")
+            failed = True
+        if args.budget_ms is not None and entry["total_ms"] > args.budget_ms:
+            print(f"  ❌ budget dépassé ({args.budget_ms:.0f} ms)")
+            failed = True
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,36 @@
 # generate_rules_complete.py
+import argparse
 import pandas as pd
-from mlxtend.frequent_patterns import apriori, association_rules
 import pickle
 import os
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../training'))
+from mining import ENGINES, ENCODINGS, MemoryBudgetExceeded, mine_rules, peak_memory
+
+parser = argparse.ArgumentParser(description="Génère rules.pkl et le bundle de service")
+parser.add_argument('--engine', choices=list(ENGINES), default='counting',
+                    help="counting : comptage exact par group-by ; apriori, fpgrowth, fpmax : mlxtend "
+                         "(résultats identiques, voir training/bench_mining.py)")
+parser.add_argument('--min-support', type=float, default=0.0001)
+parser.add_argument('--min-confidence', type=float, default=0.6)
+parser.add_argument('--target', choices=["recclass_clean"],
+                    help="ne miner que les règles {année, masse, continent} → {type} "
+                         "(les autres règles sont absentes de rules.pkl)")
+parser.add_argument('--columns', nargs='+', default=["year_period", "mass_bin", "continent", "recclass_clean"],
+                    help="colonnes catégorielles minées (ex: ajouter country)")
+parser.add_argument('--encoding', choices=ENCODINGS, default='dense',
+                    help="one-hot passé à apriori : dense ou creux (SparseDtype)")
+parser.add_argument('--memory-budget', type=float,
+                    help="budget mémoire de l'extraction en Mo : au-delà, comptage par paquets")
+parser.add_argument('--on-budget', choices=['chunk', 'abort'], default='chunk',
+                    help="si le pic estimé dépasse --memory-budget : comptage par paquets ou arrêt")
+parser.add_argument('--cache-dir', default=os.path.join(os.path.dirname(__file__), 'itemsets_cache'),
+                    help="itemsets fréquents mis en cache par contenu des colonnes et min_support")
+parser.add_argument('--no-cache', action='store_true',
+                    help="toujours ré-extraire les itemsets (le cache n'est ni lu ni écrit)")
+args = parser.parse_args()
 
 # -----------------------------
 # Charger dataset
@@ -15,7 +43,7 @@ print(f"Dataset chargé : {len(df)} lignes")
 # -----------------------------
 # Colonnes à utiliser pour apriori
 # -----------------------------
-columns = ["year_period", "mass_bin", "continent", "recclass_clean"]
+columns = args.columns
 df_small = df[columns].dropna()  # Supprimer les lignes avec valeurs manquantes
 
 print(f"Données après nettoyage : {len(df_small)} lignes")
@@ -24,44 +52,48 @@ for col in columns:
     print(f"  - {col}: {df_small[col].nunique()} valeurs")
 
 # -----------------------------
-# MODIFICATION 1: Encodage standard
+# MODIFICATION 1-3: Itemsets fréquents et règles (voir training/mining.py)
 # -----------------------------
-df_encoded = pd.get_dummies(df_small).astype(bool)
-
-print(f"Colonnes encodées : {len(df_encoded.columns)}")
-
-# -----------------------------
-# MODIFICATION 2: Support ULTRA-BAS pour MAX de règles
-# -----------------------------
-# Support à 0.0001 pour capturer TOUTES les règles possibles
-frequent_itemsets = apriori(df_encoded, min_support=0.0001, use_colnames=True)
-
-print(f"Itemsets fréquents trouvés : {len(frequent_itemsets)}")
-
-# -----------------------------
-# MODIFICATION 3: Génération avec CONFIDENCE comme métrique
-# -----------------------------
-# Utiliser confidence avec seuil à 0.6 pour cibler directement
-rules = association_rules(frequent_itemsets, metric="confidence", min_threshold=0.6)
-
-print(f"Règles générées (confidence ≥ 0.6) : {len(rules)}")
+# Support ULTRA-BAS (0.0001) pour capturer TOUTES les règles possibles,
+# CONFIDENCE comme métrique avec seuil à 0.6 pour cibler directement.
+# Les moteurs donnent les mêmes règles, dans un ordre canonique.
+# Avec --memory-budget, le pic estimé est vérifié avant d'extraire.
+# Les itemsets sont repris du cache si les mêmes colonnes ont déjà été
+# minées à un support ≤ --min-support : seules les règles et les filtres
+# ci-dessous sont recalculés (réglage des seuils en quelques secondes).
+start = time.perf_counter()
+memory_budget = None if args.memory_budget is None else args.memory_budget * 1e6
+try:
+    with peak_memory() as mining_memory:
+        frequent_itemsets, rules = mine_rules(df_small, columns, args.min_support, args.min_confidence,
+                                              args.engine, target=args.target, encoding=args.encoding,
+                                              memory_budget=memory_budget, on_budget=args.on_budget,
+                                              cache_dir=None if args.no_cache else args.cache_dir)
+except MemoryBudgetExceeded as e:
+    sys.exit(f"❌ Extraction annulée : {e}")
+
+print(f"Itemsets fréquents trouvés : {len(frequent_itemsets)} (moteur {args.engine}, "
+      f"{time.perf_counter() - start:.2f}s)")
+print(f"Pic mémoire de l'extraction : {mining_memory['peak'] / 1e6:.1f} Mo")
+print(f"Règles générées (confidence ≥ {args.min_confidence}) : {len(rules)}")
 
 # -----------------------------
 # MODIFICATION 4: Filtrage LARGE pour garder TOUT
 # -----------------------------
 # Garder tout ce qui a confidence ≥ 0.6 ET lift > 1.0
-rules = rules[(rules['confidence'] >= 0.6) & (rules['lift'] > 1.0)]
+rules = rules[(rules['confidence'] >= args.min_confidence) & (rules['lift'] > 1.0)]
 
 print(f"Règles après filtrage basique : {len(rules)}")
 
 # -----------------------------
 # Filtrer pour garder les règles qui prédisent un type
 # -----------------------------
-def has_type_in_consequents(row):
-    return any('recclass_clean_' in str(item) for item in row['consequents'])
+def has_type_in_consequents(consequents):
+    return any('recclass_clean_' in str(item) for item in consequents)
 
-type_rules = rules[rules.apply(has_type_in_consequents, axis=1)]
-other_rules = rules[~rules.apply(has_type_in_consequents, axis=1)]
+is_type_rule = rules['consequents'].map(has_type_in_consequents).astype(bool)
+type_rules = rules[is_type_rule]
+other_rules = rules[~is_type_rule]
 
 print(f"Règles prédisant un type : {len(type_rules)}")
 print(f"Autres règles : {len(other_rules)}")
@@ -218,4 +250,14 @@ print(f"   📊 TOTAL RÈGLES : {len(rules)}")
 print(f"   ✅ CONFIDENCE MOYENNE : {rules['confidence'].mean():.3f}")
 print(f"   🎯 LIFT MOYEN : {rules['lift'].mean():.3f}")
 print(f"   📈 Support moyen : {rules['support'].mean():.6f}")
-print("="*60)
\ No newline at end of file
+print("="*60)
+
+# -----------------------------
+# Bundle colonnaire pour le serveur (voir shared_store.py)
+# -----------------------------
+# Dataset + règles en fichiers mappables : app.py démarre sans relire le CSV ni le pickle
+# Nouvelle génération publiée atomiquement : les workers qui mappent l'ancienne ne sont pas touchés
+from shared_store import export_shared_data, shared_data_version, source_stamps, DEFAULT_SHARED_DIR
+export_shared_data(df, rules, DEFAULT_SHARED_DIR, shared_data_version(rules_path, dataset_path),
+                   source_stamps(rules_path, dataset_path))
+print(f"✅ Bundle de service écrit dans {DEFAULT_SHARED_DIR}")
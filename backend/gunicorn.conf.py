@@ -0,0 +1,42 @@
+# gunicorn.conf.py
+# Lancement : gunicorn -c gunicorn.conf.py app:app
+#
+# Avec preload_app, app.py (dataset, règles, index) est chargé une seule fois
+# dans le processus maître puis partagé par fork (copy-on-write). Combiné à
+# backend/shared_data/ (fichiers mappés, voir shared_store.py), les workers
+# partagent les mêmes pages au lieu de garder chacun leur copie.
+import gc
+import os
+import shutil
+import tempfile
+
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:5001")
+workers = int(os.environ.get("GUNICORN_WORKERS", 4))
+preload_app = os.environ.get("GUNICORN_PRELOAD", "1") == "1"
+
+# Workers gthread : connexions HTTP keep-alive (le worker sync ferme chaque
+# connexion après la réponse). keepalive : secondes d'attente de la requête suivante.
+worker_class = os.environ.get("GUNICORN_WORKER_CLASS", "gthread")
+threads = int(os.environ.get("GUNICORN_THREADS", 2))
+keepalive = int(os.environ.get("GUNICORN_KEEPALIVE", 5))
+
+# Compteurs de /metrics : un fichier mappé par worker dans METRICS_DIR, additionnés
+# à chaque lecture (voir app.py). Sans lui, /metrics ne montrerait que le worker
+# qui répond. Répertoire propre à ce maître, vidé au démarrage et supprimé à l'arrêt.
+metrics_dir = os.environ.setdefault(
+    "METRICS_DIR", os.path.join(tempfile.gettempdir(), f"meteorite_metrics_{os.getpid()}"))
+
+
+def on_starting(server):
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+    os.makedirs(metrics_dir, exist_ok=True)
+
+
+def on_exit(server):
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+
+
+def when_ready(server):
+    # Sortir les objets chargés du suivi du GC : ses passages ne touchent plus
+    # leurs en-têtes, donc ne recopient pas les pages partagées dans chaque worker
+    gc.freeze()
@@ -0,0 +1,213 @@
+# load_test.py
+"""
+Générateur de charge HTTP pour /predict, en boucle fermée ou ouverte.
+
+    python load_test.py --concurrency 16 --duration 30             # boucle fermée
+    python load_test.py --rate 200 --duration 30                   # boucle ouverte, 200 req/s
+    python load_test.py --rate 200 --arrivals poisson --server gunicorn --workers 4
+    python load_test.py --url http://127.0.0.1:5001 --selections mix.ndjson --output charge.json
+
+- boucle fermée : --concurrency clients, chacun renvoie une requête dès
+  la réponse reçue (débit maximal à concurrence donnée) ;
+- boucle ouverte : --rate requêtes/s planifiées quel que soit l'état du
+  serveur (arrivées constantes ou de Poisson). La latence est comptée
+  depuis l'instant planifié : l'attente due à un serveur saturé est incluse.
+
+Sans --url, le serveur (--server flask | gunicorn | asgi) est lancé sur un
+port libre depuis backend/ (voir server_harness.py) avec l'environnement courant (PREDICT_CACHE_SIZE=0
+pour mesurer le moteur plutôt que le cache). Les sélections sont rejouées
+depuis un fichier NDJSON ou JSON (liste), sinon server_harness.SELECTIONS.
+Rapport : débit, taux d'erreur et p50/p95/p99 par fenêtre de --interval
+secondes, puis global.
+"""
+import argparse
+import http.client
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+import numpy as np
+
+from server_harness import SELECTIONS, SERVERS, start_server, stop_server
+
+
+def load_selections(path):
+    if path is None:
+        return SELECTIONS
+    with open(path, encoding='utf-8') as f:
+        text = f.read()
+    if text.lstrip().startswith('['):
+        return json.loads(text)
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+# -----------------------------
+# Client
+# -----------------------------
+class Client:
+    """Connexion keep-alive par thread vers /predict."""
+
+    def __init__(self, url, path="/predict", timeout=30):
+        parts = urlsplit(url)
+        self.host, self.port = parts.hostname, parts.port or 80
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def post(self, body):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        try:
+            conn.request("POST", self.path, body, {"Content-Type": "application/json"})
+            response = conn.getresponse()
+            response.read()
+            return response.status
+        except (OSError, http.client.HTTPException):
+            conn.close()
+            self._local.conn = None
+            return 0
+
+
+def run_closed_loop(client, bodies, concurrency, duration):
+    """Chaque client enchaîne les requêtes ; renvoie [(début, latence, statut)]."""
+    results = []
+    lock = threading.Lock()
+    t0 = time.perf_counter()
+    deadline = t0 + duration
+
+    def worker(offset):
+        local, i = [], offset
+        while True:
+            start = time.perf_counter()
+            if start >= deadline:
+                break
+            status = client.post(bodies[i % len(bodies)])
+            local.append((start - t0, time.perf_counter() - start, status))
+            i += concurrency
+        with lock:
+            results.extend(local)
+
+    threads = [threading.Thread(target=worker, args=(k,)) for k in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sorted(results)
+
+
+def run_open_loop(client, bodies, rate, duration, arrivals, max_inflight, seed=0):
+    """Requêtes planifiées à rate/s ; latence mesurée depuis l'instant planifié."""
+    rng = np.random.default_rng(seed)
+    n = int(rate * duration)
+    if arrivals == 'poisson':
+        schedule = np.cumsum(rng.exponential(1 / rate, n))
+    else:
+        schedule = np.arange(n) / rate
+    results = [None] * n
+    t0 = time.perf_counter()
+
+    def send(i):
+        status = client.post(bodies[i % len(bodies)])
+        results[i] = (schedule[i], time.perf_counter() - t0 - schedule[i], status)
+
+    with ThreadPoolExecutor(max_workers=max_inflight) as pool:
+        for i, at in enumerate(schedule):
+            delay = t0 + at - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(send, i)
+    return results
+
+# -----------------------------
+# Rapport
+# -----------------------------
+def summarize(results, elapsed):
+    latencies = np.array([r[1] for r in results]) * 1000
+    errors = sum(1 for r in results if r[2] != 200)
+    if len(latencies) == 0:
+        return {"requests": 0, "throughput_rps": 0.0, "error_rate": 0.0}
+    return {
+        "requests": len(results),
+        "throughput_rps": len(results) / elapsed,
+        "error_rate": errors / len(results),
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p95_ms": float(np.percentile(latencies, 95)),
+        "p99_ms": float(np.percentile(latencies, 99)),
+        "max_ms": float(latencies.max()),
+    }
+
+
+def windows(results, interval, duration):
+    """Résumé par fenêtre de temps (selon l'instant d'envoi)."""
+    series = []
+    for k in range(int(np.ceil(duration / interval))):
+        window = [r for r in results if k * interval <= r[0] < (k + 1) * interval]
+        span = min(interval, duration - k * interval)
+        series.append(dict(summarize(window, span), t=k * interval))
+    return series
+
+
+def _print_line(label, summary):
+    if not summary["requests"]:
+        print(f"{label:>8s}  aucune requête")
+        return
+    print(f"{label:>8s}  {summary['throughput_rps']:8.1f} req/s  erreurs {summary['error_rate']:6.2%}  "
+          f"p50 {summary['p50_ms']:7.1f} ms  p95 {summary['p95_ms']:7.1f} ms  p99 {summary['p99_ms']:7.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Charge HTTP sur /predict (boucle ouverte ou fermée)")
+    parser.add_argument("--url", help="serveur déjà lancé (sinon lancé localement)")
+    parser.add_argument("--server", choices=list(SERVERS), default="flask")
+    parser.add_argument("--workers", type=int, default=1, help="workers gunicorn / uvicorn")
+    parser.add_argument("--selections", help="fichier NDJSON ou JSON de sélections à rejouer")
+    parser.add_argument("--concurrency", type=int, default=8, help="clients en boucle fermée")
+    parser.add_argument("--rate", type=float, help="req/s : active la boucle ouverte")
+    parser.add_argument("--arrivals", choices=["constant", "poisson"], default="constant")
+    parser.add_argument("--max-inflight", type=int, default=256, help="requêtes simultanées max (boucle ouverte)")
+    parser.add_argument("--duration", type=float, default=10.0, help="secondes")
+    parser.add_argument("--warmup", type=int, default=20, help="requêtes de chauffe non comptées")
+    parser.add_argument("--interval", type=float, default=1.0, help="largeur des fenêtres du rapport (s)")
+    parser.add_argument("--output", help="fichier JSON du rapport")
+    args = parser.parse_args()
+
+    bodies = [json.dumps(sel) for sel in load_selections(args.selections)]
+    process = None
+    url = args.url
+    if url is None:
+        process, url = start_server(args.server, args.workers)
+    try:
+        client = Client(url)
+        for i in range(args.warmup):
+            client.post(bodies[i % len(bodies)])
+
+        start = time.perf_counter()
+        if args.rate:
+            mode = f"ouverte {args.rate:g} req/s ({args.arrivals})"
+            results = run_open_loop(client, bodies, args.rate, args.duration, args.arrivals, args.max_inflight)
+        else:
+            mode = f"fermée {args.concurrency} clients"
+            results = run_closed_loop(client, bodies, args.concurrency, args.duration)
+        elapsed = time.perf_counter() - start
+    finally:
+        if process is not None:
+            stop_server(process)
+
+    series = windows(results, args.interval, args.duration)
+    overall = summarize(results, elapsed)
+    print(f"Boucle {mode}, {url}")
+    for window in series:
+        _print_line(f"{window['t']:.0f}s", window)
+    _print_line("total", overall)
+
+    if args.output:
+        report = {"url": url, "mode": "open" if args.rate else "closed", "args": vars(args),
+                  "overall": overall, "windows": series}
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+# serialization.py
+"""
+Sérialisation JSON et compression des réponses du backend.
+
+- dumps(obj) -> bytes : orjson s'il est installé (scalaires et tableaux
+  NumPy sérialisés nativement, sans conversion élément par élément),
+  sinon json de la bibliothèque standard avec json_default.
+  JSON_SERIALIZER=json force la bibliothèque standard.
+- compress(body, accept_encoding) : brotli (si installé) ou gzip selon
+  l'en-tête Accept-Encoding du client, au-delà de COMPRESS_MIN_BYTES
+  (défaut : 1024 octets). COMPRESS_MIN_BYTES=0 désactive la compression.
+Les clés sont triées, comme avec jsonify de Flask.
+"""
+import gzip
+import json
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../training'))
+from rule_engine import json_default
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+SERIALIZER = os.environ.get("JSON_SERIALIZER", "orjson" if orjson is not None else "json")
+COMPRESS_MIN_BYTES = int(os.environ.get("COMPRESS_MIN_BYTES", 1024))
+GZIP_LEVEL = 5
+BROTLI_QUALITY = 4
+
+if SERIALIZER == "orjson" and orjson is None:
+    raise ImportError("JSON_SERIALIZER=orjson mais orjson n'est pas installé")
+
+# -----------------------------
+# Sérialisation
+# -----------------------------
+def _dumps_json(obj):
+    return json.dumps(obj, default=json_default, sort_keys=True, separators=(",", ":")).encode("utf-8")
+
+
+def _dumps_orjson(obj):
+    return orjson.dumps(obj, default=json_default,
+                        option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS)
+
+
+SERIALIZERS = {"json": _dumps_json}
+if orjson is not None:
+    SERIALIZERS["orjson"] = _dumps_orjson
+
+
+def dumps(obj):
+    return SERIALIZERS[SERIALIZER](obj)
+
+# -----------------------------
+# Compression négociée
+# -----------------------------
+def _qualities(accept_encoding):
+    """{encodage: q} de l'en-tête Accept-Encoding (q=0 : refusé explicitement)."""
+    qualities = {}
+    for part in (accept_encoding or "").split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        if name.strip():
+            qualities[name.strip().lower()] = quality
+    return qualities
+
+
+def choose_encoding(accept_encoding, size):
+    """
+    br s'il est demandé nommément, sinon gzip s'il est demandé nommément
+    ou couvert par "*" ; un encodage refusé (q=0) ne l'est jamais, même avec "*".
+    """
+    if COMPRESS_MIN_BYTES <= 0 or size < COMPRESS_MIN_BYTES:
+        return None
+    qualities = _qualities(accept_encoding)
+    if brotli is not None and qualities.get("br", 0) > 0:
+        return "br"
+    if qualities.get("gzip", qualities.get("*", 0)) > 0:
+        return "gzip"
+    return None
+
+
+def compress(body, accept_encoding):
+    """Renvoie (corps, encodage) ; encodage None si non compressé."""
+    encoding = choose_encoding(accept_encoding, len(body))
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY), encoding
+    if encoding == "gzip":
+        return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0), encoding
+    return body, None
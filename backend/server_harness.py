@@ -0,0 +1,104 @@
+# server_harness.py
+"""
+Outils communs aux scripts de mesure (bench_serving.py, bench_memory.py,
+load_test.py) : mélange de sélections par défaut et lancement d'un
+serveur local (flask | gunicorn | asgi) sur un port libre.
+
+    with running_server("gunicorn", workers=4, env={"PREDICT_CACHE_SIZE": "0"}) as (url, process):
+        ...
+
+Le serveur est prêt quand POST /predict répond 200 (données chargées),
+plus la condition ready(process) si elle est donnée.
+"""
+import contextlib
+import http.client
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Mélange de sélections rejoué par défaut
+SELECTIONS = [
+    {"years": None, "mass": ["1-10g"], "continents": None},
+    {"years": [2000], "mass": None, "continents": ["Asia"]},
+    {"years": [[1990, 2010]], "mass": ["10-100g"], "continents": None},
+    {"years": [[1850, 1950]], "mass": None, "continents": ["Europe"]},
+    {"years": None, "mass": [">10kg"], "continents": ["Africa"]},
+    {"years": [1880], "mass": ["<1g"], "continents": ["Antarctica"]},
+]
+
+SERVERS = {
+    "flask": [sys.executable, "-m", "flask", "--app", "app", "run", "--port", "{port}"],
+    "gunicorn": [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py",
+                 "--bind", "127.0.0.1:{port}", "--workers", "{workers}", "app:app"],
+    "asgi": [sys.executable, "-m", "uvicorn", "asgi:app", "--port", "{port}",
+             "--workers", "{workers}", "--log-level", "warning"],
+}
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def post_selection(port, sel, timeout=30):
+    """POST /predict sur une connexion neuve ; renvoie le statut HTTP."""
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=timeout)
+    try:
+        conn.request("POST", "/predict", json.dumps(sel), {"Content-Type": "application/json"})
+        response = conn.getresponse()
+        response.read()
+        return response.status
+    finally:
+        conn.close()
+
+
+def _wait_ready(port, process, ready, timeout):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("le serveur s'est arrêté au démarrage")
+        try:
+            if post_selection(port, SELECTIONS[0]) == 200 and (ready is None or ready(process)):
+                return
+        except OSError:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError("le serveur n'a pas démarré à temps")
+
+
+def start_server(name, workers=1, env=None, ready=None, timeout=180):
+    """
+    Lance le serveur name depuis backend/ (environnement courant complété
+    par env) et attend qu'il réponde. Renvoie (process, url).
+    """
+    port = free_port()
+    command = [part.format(port=port, workers=workers) for part in SERVERS[name]]
+    process = subprocess.Popen(command, cwd=BACKEND_DIR, env=dict(os.environ, **(env or {})),
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        _wait_ready(port, process, ready, timeout)
+    except BaseException:
+        stop_server(process)
+        raise
+    return process, f"http://127.0.0.1:{port}"
+
+
+def stop_server(process):
+    process.terminate()
+    process.wait()
+
+
+@contextlib.contextmanager
+def running_server(name, workers=1, env=None, ready=None, timeout=180):
+    """start_server le temps du bloc : renvoie (url, process), arrêt garanti."""
+    process, url = start_server(name, workers, env, ready, timeout)
+    try:
+        yield url, process
+    finally:
+        stop_server(process)
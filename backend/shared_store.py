@@ -0,0 +1,263 @@
+# shared_store.py
+"""
+Bundle colonnaire des données de service : dataset + règles, sans CSV
+ni pickle à relire au démarrage.
+
+Le dataset et les règles sont écrits une fois dans un répertoire de
+fichiers .npy, puis ouverts en mémoire mappée (lecture seule) :
+- colonnes numériques : float32 quand la conversion est exacte (year...),
+  sinon dtype d'origine ;
+- colonnes texte : codes catégoriels .npy + catégories dans un tampon
+  unique de chaînes internées (chaque chaîne distincte stockée une fois) ;
+- règles : antécédents / conséquents encodés en identifiants d'items
+  (listes concaténées + offsets), métriques en float64 (les scores en
+  dépendent), listes de l'index inversé et tableaux de métadonnées.
+Les pages mappées sont partagées par tous les processus : N workers
+coûtent environ une copie des données (avec preload_app, voir gunicorn.conf.py).
+
+    python shared_store.py            # écrit backend/shared_data/
+Écrit aussi par generate_rules.py après rules.pkl. app.py ouvre
+backend/shared_data/ s'il existe (ou SHARED_DATA_DIR), sinon rules.pkl + CSV.
+
+Chaque export va dans un nouveau sous-répertoire (génération), puis
+manifest.json, qui désigne la génération courante, est remplacé
+atomiquement : un fichier déjà mappé par un worker n'est jamais tronqué
+ni réécrit. Seules la génération courante et la précédente sont gardées.
+Le manifest note taille et date des fichiers sources (rules.pkl, CSV) :
+vérifier que le bundle est à jour ne relit pas ces fichiers.
+"""
+import argparse
+import contextlib
+import json
+import os
+import pickle
+import shutil
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../training'))
+from rule_engine import load_rule_store
+from answer_table import file_sha256
+
+STORE_FORMAT = 3
+
+DEFAULT_DATASET_PATH = os.path.join(os.path.dirname(__file__), '../data/meteorites_final_rebalanced.csv')
+DEFAULT_RULES_PATH = os.path.join(os.path.dirname(__file__), 'rules.pkl')
+DEFAULT_SHARED_DIR = os.path.join(os.path.dirname(__file__), 'shared_data')
+
+RULE_ARRAYS = ['type_id', 'is_type_rule', 'is_geo_tautology', 'confidence', 'lift', 'support']
+
+# Générations conservées : la courante et la précédente (workers pas encore rechargés)
+KEEP_GENERATIONS = 2
+
+
+def shared_data_version(rules_path, dataset_path):
+    return {
+        'format': STORE_FORMAT,
+        'rules_sha256': file_sha256(rules_path),
+        'dataset_sha256': file_sha256(dataset_path),
+    }
+
+def source_stamps(rules_path, dataset_path):
+    """Taille et date (ns) des fichiers sources : contrôle du bundle sans les relire."""
+    stamps = {}
+    for name, path in (('rules', rules_path), ('dataset', dataset_path)):
+        stat = os.stat(path)
+        stamps[name] = [stat.st_size, stat.st_mtime_ns]
+    return stamps
+
+def _compact_numeric(values):
+    """float32 si la conversion ne perd rien, sinon le tableau d'origine."""
+    if values.dtype.kind == 'f' and values.dtype.itemsize > 4:
+        narrow = values.astype(np.float32)
+        if np.array_equal(narrow.astype(values.dtype), values, equal_nan=True):
+            return narrow
+    return values
+
+# -----------------------------
+# Écriture
+# -----------------------------
+def export_shared_data(df, rules, directory, version, sources=None):
+    """
+    Écrit le dataset et les règles (DataFrame de rules.pkl) dans une
+    nouvelle génération de directory, puis la publie (manifest.json).
+    sources : source_stamps() des fichiers d'origine, vérifiés à l'ouverture.
+    """
+    generation = f"gen-{time.time_ns()}-{os.getpid()}"
+    generation_dir = os.path.join(directory, generation)
+    os.makedirs(generation_dir)
+    store = load_rule_store(rules)
+    strings = {}
+
+    def string_id(value):
+        return strings.setdefault(value, len(strings))
+
+    def save(name, array):
+        np.save(os.path.join(generation_dir, f'{name}.npy'), np.ascontiguousarray(array))
+
+    columns = []
+    for i, name in enumerate(df.columns):
+        column = df[name]
+        if pd.api.types.is_numeric_dtype(column.dtype) and not isinstance(column.dtype, pd.CategoricalDtype):
+            save(f'col_{i}', _compact_numeric(column.to_numpy()))
+            columns.append({'name': name, 'kind': 'numeric'})
+        else:
+            # Catégories triées : mode() renvoie le même résultat qu'en texte brut.
+            # Codes au dtype choisi par pandas (int8 / int16...) : relus tels quels
+            # par from_codes, sans conversion ni copie (voir open_shared_data)
+            categorical = pd.Categorical(column)
+            save(f'col_{i}', categorical.codes)
+            columns.append({
+                'name': name,
+                'kind': 'category',
+                'categories': [string_id(str(c)) for c in categorical.categories],
+            })
+
+    # Règles : items encodés en identifiants du tampon de chaînes
+    rule_frame = store['rules']
+    set_columns = ['antecedents', 'consequents']
+    for name in set_columns:
+        item_lists = [sorted(str(item) for item in items) for items in rule_frame[name]]
+        save(f'rule_{name}', np.array([string_id(item) for items in item_lists for item in items],
+                                      dtype=np.int32))
+        save(f'rule_{name}_offsets',
+             np.concatenate([[0], np.cumsum([len(items) for items in item_lists])]).astype(np.int64))
+    metric_columns = [name for name in rule_frame.columns if name not in set_columns]
+    for j, name in enumerate(metric_columns):
+        save(f'rule_metric_{j}', rule_frame[name].to_numpy(dtype=np.float64))
+
+    postings = store['index']['postings']
+    items = sorted(postings)
+    lengths = [len(postings[item]) for item in items]
+    save('postings', np.concatenate([postings[item] for item in items]) if items
+         else np.empty(0, dtype=np.int32))
+    save('posting_offsets', np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64))
+    for name in RULE_ARRAYS:
+        save(name, store[name])
+
+    manifest = {
+        'version': version,
+        'sources': sources,
+        'generation': generation,
+        'n_rows': len(df),
+        'n_rules': store['index']['n_rules'],
+        'columns': columns,
+        'rule_columns': list(rule_frame.columns),
+        'rule_metrics': metric_columns,
+        'items': [string_id(item) for item in items],
+        'type_names': [string_id(name) for name in store['type_names']],
+    }
+    # Tampon unique de toutes les chaînes (catégories, items, types)
+    encoded = [s.encode('utf-8') for s in strings]
+    save('strings', np.frombuffer(b''.join(encoded), dtype=np.uint8))
+    save('string_offsets', np.concatenate([[0], np.cumsum([len(b) for b in encoded])]).astype(np.int64))
+
+    # Publication atomique : un lecteur voit l'ancien manifest ou le nouveau, complet
+    manifest_path = os.path.join(directory, 'manifest.json')
+    tmp_path = f"{manifest_path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, manifest_path)
+    _prune_generations(directory, generation)
+
+def _prune_generations(directory, current):
+    """
+    Supprime les générations plus anciennes que les KEEP_GENERATIONS dernières.
+    Un fichier encore mappé reste lisible après suppression (POSIX) ; sinon
+    (Windows) la suppression échoue sans erreur et sera retentée au prochain export.
+    """
+    generations = sorted((name for name in os.listdir(directory) if name.startswith('gen-')),
+                         key=lambda name: int(name.split('-')[1]))
+    for name in generations[:-KEEP_GENERATIONS]:
+        if name != current:
+            shutil.rmtree(os.path.join(directory, name), ignore_errors=True)
+    # Fichiers de l'ancienne disposition (avant les générations), directement dans directory
+    for name in os.listdir(directory):
+        if name.endswith('.npy'):
+            with contextlib.suppress(OSError):
+                os.remove(os.path.join(directory, name))
+
+# -----------------------------
+# Ouverture (mémoire mappée)
+# -----------------------------
+def read_manifest(directory):
+    with open(os.path.join(directory, 'manifest.json')) as f:
+        manifest = json.load(f)
+    if manifest['version'].get('format') != STORE_FORMAT:
+        raise ValueError(f"données partagées au format {manifest['version'].get('format')} "
+                         f"({directory}), format {STORE_FORMAT} attendu")
+    return manifest
+
+def open_shared_data(directory, expected_sources=None):
+    """
+    Ouvre la génération courante en mémoire mappée et renvoie
+    (df, rules, store, version) : rules au format de rules.pkl (index
+    0..n-1), store au format de load_rule_store, version celle des
+    fichiers sources à l'export. Seuls les ensembles d'items des règles
+    sont recréés en objets Python ; tout le reste pointe dans les
+    fichiers mappés. expected_sources : source_stamps() actuels.
+    """
+    manifest = read_manifest(directory)
+    if expected_sources is not None and manifest['sources'] != expected_sources:
+        raise ValueError(f"données partagées obsolètes ({directory}) : rules.pkl ou dataset modifié")
+    generation_dir = os.path.join(directory, manifest['generation'])
+
+    def load(name):
+        return np.asarray(np.load(os.path.join(generation_dir, f'{name}.npy'), mmap_mode='r'))
+
+    buffer, offsets = load('strings'), load('string_offsets')
+    strings = [bytes(buffer[offsets[i]:offsets[i + 1]]).decode('utf-8') for i in range(len(offsets) - 1)]
+
+    data = {}
+    for i, column in enumerate(manifest['columns']):
+        values = load(f'col_{i}')
+        if column['kind'] == 'category':
+            categories = pd.Index([strings[j] for j in column['categories']])
+            # Même dtype qu'à l'export : from_codes garde le tableau mappé (pas de copie
+            # par worker), vérifié par test_shared_store.py
+            values = pd.Categorical.from_codes(values, categories=categories, validate=False)
+        data[column['name']] = pd.Series(values, copy=False)
+    df = pd.DataFrame(data, copy=False)
+
+    rule_data = {}
+    for name in ('antecedents', 'consequents'):
+        ids, bounds = load(f'rule_{name}').tolist(), load(f'rule_{name}_offsets').tolist()
+        items = [strings[k] for k in ids]
+        rule_data[name] = [set(items[bounds[r]:bounds[r + 1]]) for r in range(manifest['n_rules'])]
+    for j, name in enumerate(manifest['rule_metrics']):
+        rule_data[name] = load(f'rule_metric_{j}')
+    rules = pd.DataFrame({name: rule_data[name] for name in manifest['rule_columns']}, copy=False)
+
+    all_postings, posting_offsets = load('postings'), load('posting_offsets')
+    postings = {
+        strings[item]: all_postings[posting_offsets[k]:posting_offsets[k + 1]]
+        for k, item in enumerate(manifest['items'])
+    }
+    store = {
+        'rules': rules,
+        'index': {'n_rules': manifest['n_rules'], 'postings': postings},
+        'type_names': [strings[j] for j in manifest['type_names']],
+    }
+    for name in RULE_ARRAYS:
+        store[name] = load(name)
+
+    return df, rules, store, manifest['version']
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Écrit les données de service en fichiers mappables")
+    parser.add_argument('--rules', default=DEFAULT_RULES_PATH)
+    parser.add_argument('--dataset', default=DEFAULT_DATASET_PATH)
+    parser.add_argument('--output', default=DEFAULT_SHARED_DIR)
+    args = parser.parse_args()
+
+    df = pd.read_csv(args.dataset)
+    with open(args.rules, 'rb') as f:
+        rules = pickle.load(f)
+
+    export_shared_data(df, rules, args.output, shared_data_version(args.rules, args.dataset),
+                       source_stamps(args.rules, args.dataset))
+    print(f"✅ Données partagées écrites dans {args.output}")
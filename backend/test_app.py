@@ -0,0 +1,98 @@
+# test_app.py
+"""
+Validation des paramètres de /predict et /predict/stream (erreurs 400
+plutôt que 500 ou réponse tronquée).
+
+    python -m pytest -q test_app.py
+"""
+import base64
+import json
+
+import pytest
+
+import app as serving
+
+SELECTION = {"years": None, "mass": ["1-10g"], "continents": None}
+
+
+@pytest.fixture
+def client():
+    return serving.app.test_client()
+
+
+def _cursor(state):
+    return base64.urlsafe_b64encode(json.dumps(state).encode()).decode()
+
+# -----------------------------
+# Pagination (/predict)
+# -----------------------------
+def test_page_size_rejects_boolean(client):
+    response = client.post("/predict", json=dict(SELECTION, page_size=True))
+    assert response.status_code == 400
+
+
+def test_sample_seed_rejects_boolean(client):
+    response = client.post("/predict", json=dict(SELECTION, page_size=5, sample_seed=False))
+    assert response.status_code == 400
+
+
+def test_sample_seed_rejects_negative(client):
+    response = client.post("/predict", json=dict(SELECTION, page_size=5, sample_seed=-1))
+    assert response.status_code == 400
+    assert "sample_seed" in response.get_json()["error"]
+
+
+def test_cursor_rejects_negative_offset(client):
+    first = client.post("/predict", json=dict(SELECTION, page_size=5)).get_json()
+    state = json.loads(base64.urlsafe_b64decode(first["next_cursor"]))
+    state["o"] = -3
+    response = client.post("/predict", json=dict(SELECTION, cursor=_cursor(state)))
+    assert response.status_code == 400
+
+
+def test_cursor_next_page(client):
+    first = client.post("/predict", json=dict(SELECTION, page_size=5)).get_json()
+    second = client.post("/predict", json=dict(SELECTION, cursor=first["next_cursor"]))
+    assert second.status_code == 200
+    assert len(second.get_json()["names"]) == 5
+
+# -----------------------------
+# Flux NDJSON (/predict/stream)
+# -----------------------------
+STREAM_BODY = "\n".join(json.dumps(SELECTION) for _ in range(3)) + "\n"
+
+
+@pytest.mark.parametrize("chunk_size", ["0", "-1", "abc"])
+def test_stream_rejects_invalid_chunk_size(client, chunk_size):
+    response = client.post(f"/predict/stream?chunk_size={chunk_size}", data=STREAM_BODY)
+    assert response.status_code == 400
+    assert "chunk_size" in response.get_json()["error"]
+
+
+def test_stream_scores_every_line(client):
+    response = client.post("/predict/stream?chunk_size=2", data=STREAM_BODY)
+    assert response.status_code == 200
+    assert len(response.get_data(as_text=True).splitlines()) == 3
+
+
+def test_stream_uses_response_serializer(client):
+    snap = serving.current_snapshot()
+    expected = [serving.dumps(r) for r in serving._predict_many([SELECTION] * 3, snap)]
+    response = client.post("/predict/stream", data=STREAM_BODY)
+    assert response.get_data().splitlines() == expected
+
+
+@pytest.mark.parametrize("chunk_size", [0, -1])
+def test_score_ndjson_rejects_invalid_chunk_size(chunk_size):
+    with pytest.raises(ValueError):
+        serving.score_ndjson(iter(STREAM_BODY.splitlines()), lambda sels: [], chunk_size)
+
+# -----------------------------
+# Lot (/predict/batch)
+# -----------------------------
+def test_batch_items_carry_rules_version(client):
+    response = client.post("/predict/batch", json=[SELECTION, 3]).get_json()
+    version = response["rules_version"]
+    assert [item["rules_version"] for item in response["results"]] == [version, version]
+    single = client.post("/predict", json=SELECTION).get_json()
+    assert response["results"][0] == single
@@ -0,0 +1,62 @@
+# test_shared_store.py
+"""
+Bundle mappé (shared_store.py) : colonnes et règles lues sans copie,
+directement dans les fichiers mappés.
+
+    python -m pytest -q test_shared_store.py
+"""
+import mmap
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from shared_store import (export_shared_data, open_shared_data, shared_data_version, source_stamps,
+                          DEFAULT_DATASET_PATH, DEFAULT_RULES_PATH)
+
+
+def _mapping(array):
+    """Tableau np.memmap à l'origine de array (None si array n'est pas mappé)."""
+    base = array
+    while base is not None:
+        if isinstance(base, np.memmap) or isinstance(getattr(base, 'base', None), mmap.mmap):
+            return base
+        base = getattr(base, 'base', None)
+    return None
+
+
+@pytest.fixture(scope="module")
+def bundle(tmp_path_factory):
+    directory = str(tmp_path_factory.mktemp("shared_data"))
+    df = pd.read_csv(DEFAULT_DATASET_PATH)
+    rules = pd.read_pickle(DEFAULT_RULES_PATH)
+    export_shared_data(df, rules, directory, shared_data_version(DEFAULT_RULES_PATH, DEFAULT_DATASET_PATH),
+                       source_stamps(DEFAULT_RULES_PATH, DEFAULT_DATASET_PATH))
+    return df, open_shared_data(directory)
+
+
+def test_category_codes_stay_mapped(bundle):
+    _, (df, _, _, _) = bundle
+    categorical = [name for name in df.columns if isinstance(df[name].dtype, pd.CategoricalDtype)]
+    assert categorical
+    for name in categorical:
+        codes = df[name].array._ndarray
+        mapping = _mapping(codes)
+        assert mapping is not None, name
+        assert np.shares_memory(codes, mapping), name
+
+
+def test_numeric_columns_and_rule_metrics_stay_mapped(bundle):
+    _, (df, rules, store, _) = bundle
+    for name in df.columns:
+        if not isinstance(df[name].dtype, pd.CategoricalDtype):
+            assert _mapping(df[name].to_numpy()) is not None, name
+    assert _mapping(rules['confidence'].to_numpy()) is not None
+    assert _mapping(store['confidence']) is not None
+
+
+def test_round_trip(bundle):
+    source, (df, _, _, _) = bundle
+    pd.testing.assert_frame_equal(df.astype(object).where(df.notna(), None),
+                                  source.astype(object).where(source.notna(), None),
+                                  check_dtype=False, check_exact=False)
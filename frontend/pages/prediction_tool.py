@@ -326,6 +326,11 @@ def convert_mass_to_interval(mass_grams):
     except:
         return None, "Invalide"
 
+@st.cache_resource
+def _backend_session():
+    """Session HTTP partagée : connexion keep-alive réutilisée entre les prédictions."""
+    return requests.Session()
+
 def show_prediction_tool():
     st.title(" Advanced Meteorite Prediction Tool")
     
@@ -602,8 +607,8 @@ def show_prediction_tool():
             
             try:
                 # Call backend
-                response = requests.post("https://mini-projet-ml-backend1.onrender.com/predict", 
-                                        json=payload, timeout=10)
+                response = _backend_session().post("https://mini-projet-ml-backend1.onrender.com/predict",
+                                                   json=payload, timeout=10)
                 
                 if response.status_code == 200:
                     result = response.json()
@@ -0,0 +1,183 @@
+# bench_engine.py
+"""
+Microbenchmark du moteur sur toute la grille de sélections :
+(aucune période | chaque période) x (aucune masse | chaque mass_bin)
+x (aucun continent | chaque continent), plus des variantes d'années
+(année seule, plages, paires), à plusieurs tailles de dataset et de règles.
+
+    python bench_engine.py                              # tailles 0.25, 0.5, 1
+    python bench_engine.py --dataset-scales 1 4 --rule-scales 0.5 1
+    python bench_engine.py --output bench.json --compare bench_precedent.json
+
+Fonctions mesurées directement (sans serveur) : process_user_selection,
+filter_rules (strict), predict_missing_criteria et get_type_info.
+Une échelle > 1 rééchantillonne avec remise. Résultats : p50/p95/p99 (ms)
+et opérations/s par fonction et par taille, enregistrés en JSON ; avec
+--compare, code de sortie 1 si un p50 se dégrade de plus de --threshold %.
+"""
+import argparse
+import itertools
+import json
+import os
+import pickle
+import platform
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from rule_engine import (load_rule_store, build_year_period_table, filter_rules,
+                         process_user_selection, predict_missing_criteria, get_type_info,
+                         get_most_probable_type)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_DATASET_PATH = os.path.join(BASE_DIR, '..', 'data', 'meteorites_final_rebalanced.csv')
+DEFAULT_RULES_PATH = os.path.join(BASE_DIR, '..', 'backend', 'rules.pkl')
+
+YEAR_VARIANTS = [[2000], [1880], [[1990, 2010]], [[1850, 1950]], [1990, 1991]]
+
+FUNCTIONS = ['process_user_selection', 'filter_rules', 'predict_missing_criteria', 'get_type_info']
+
+
+def selection_grid(df):
+    """Grille complète ; une période est sélectionnée par la plage de ses années."""
+    periods = df.groupby('year_period')['year'].agg(['min', 'max'])
+    years_options = [None] + [[[int(row['min']), int(row['max'])]] for _, row in periods.iterrows()]
+    years_options += YEAR_VARIANTS
+    mass_options = [None] + [[m] for m in sorted(df['mass_bin'].dropna().unique())]
+    continent_options = [None] + [[c] for c in sorted(df['continent'].dropna().unique())]
+    return [
+        {'years': years, 'mass': mass, 'continents': continents}
+        for years, mass, continents in itertools.product(years_options, mass_options, continent_options)
+    ]
+
+
+def scale(frame, factor, seed=0):
+    if factor == 1:
+        return frame.reset_index(drop=True)
+    return frame.sample(frac=factor, replace=factor > 1, random_state=seed).reset_index(drop=True)
+
+
+def summarize(function, timings):
+    timings = np.asarray(timings)
+    ms = timings * 1000
+    return {
+        'function': function,
+        'calls': len(timings),
+        'p50_ms': float(np.percentile(ms, 50)),
+        'p95_ms': float(np.percentile(ms, 95)),
+        'p99_ms': float(np.percentile(ms, 99)),
+        'ops_per_sec': len(timings) / max(float(timings.sum()), 1e-12),
+    }
+
+
+def bench_size(df, rules, grid, repeat):
+    store = load_rule_store(rules)
+    year_table = build_year_period_table(df)
+    clock = time.perf_counter
+    timings = {name: [] for name in FUNCTIONS}
+
+    for sel in grid:
+        years, mass, continents = sel['years'] or None, sel['mass'] or None, sel['continents'] or None
+        for _ in range(repeat):
+            start = clock()
+            result = process_user_selection(sel, rules, df, store=store, year_table=year_table)
+            timings['process_user_selection'].append(clock() - start)
+
+            start = clock()
+            filter_rules(rules, df, years or [], mass or [], continents or [], strict=True,
+                         store=store, year_table=year_table)
+            timings['filter_rules'].append(clock() - start)
+
+            # Type prédit par le moteur : mêmes entrées que dans process_user_selection
+            top_type, _ = get_most_probable_type(result['filtered_rules'], df, store)
+            start = clock()
+            year_pred, mass_pred, continent_pred = predict_missing_criteria(
+                df, top_type, years, mass, continents)
+            timings['predict_missing_criteria'].append(clock() - start)
+
+            start = clock()
+            get_type_info(df, top_type, years, mass, continents, year_pred, mass_pred, continent_pred)
+            timings['get_type_info'].append(clock() - start)
+
+    return [summarize(name, timings[name]) for name in FUNCTIONS]
+
+
+def compare(report, previous, threshold):
+    """Régressions de p50 (en %) par rapport à un rapport précédent."""
+    def key(entry):
+        return entry['dataset_scale'], entry['rule_scale'], entry['function']
+
+    before = {key(entry): entry for entry in previous['results']}
+    regressions = []
+    for entry in report['results']:
+        old = before.get(key(entry))
+        if old is None or old['p50_ms'] <= 0:
+            continue
+        change = (entry['p50_ms'] / old['p50_ms'] - 1) * 100
+        entry['p50_change_pct'] = change
+        if change > threshold:
+            regressions.append(entry)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Microbenchmark du moteur sur la grille de sélections")
+    parser.add_argument('--rules', default=DEFAULT_RULES_PATH)
+    parser.add_argument('--dataset', default=DEFAULT_DATASET_PATH)
+    parser.add_argument('--dataset-scales', type=float, nargs='+', default=[0.25, 0.5, 1.0])
+    parser.add_argument('--rule-scales', type=float, nargs='+', default=[1.0])
+    parser.add_argument('--repeat', type=int, default=1, help="passages par sélection")
+    parser.add_argument('--output', help="fichier JSON des résultats")
+    parser.add_argument('--compare', help="rapport JSON précédent à comparer")
+    parser.add_argument('--threshold', type=float, default=20.0,
+                        help="dégradation de p50 tolérée en %% avec --compare")
+    args = parser.parse_args()
+
+    full_df = pd.read_csv(args.dataset)
+    with open(args.rules, 'rb') as f:
+        full_rules = pickle.load(f)
+    grid = selection_grid(full_df)
+
+    report = {
+        'meta': {
+            'python': platform.python_version(),
+            'pandas': pd.__version__,
+            'numpy': np.__version__,
+            'machine': platform.machine(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'grid_size': len(grid),
+            'repeat': args.repeat,
+        },
+        'results': [],
+    }
+    print(f"Grille : {len(grid)} sélections")
+    for dataset_scale, rule_scale in itertools.product(args.dataset_scales, args.rule_scales):
+        df = scale(full_df, dataset_scale)
+        rules = scale(full_rules, rule_scale)
+        for entry in bench_size(df, rules, grid, args.repeat):
+            entry.update(dataset_scale=dataset_scale, rule_scale=rule_scale,
+                         dataset_rows=len(df), n_rules=len(rules))
+            report['results'].append(entry)
+            print(f"{len(df):>8d} lignes {len(rules):>6d} règles  {entry['function']:26s} "
+                  f"p50 {entry['p50_ms']:7.2f} ms  p95 {entry['p95_ms']:7.2f} ms  "
+                  f"p99 {entry['p99_ms']:7.2f} ms  {entry['ops_per_sec']:8.1f} op/s")
+
+    failed = False
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(report, json.load(f), args.threshold)
+        for entry in regressions:
+            print(f"❌ régression {entry['function']} ({entry['dataset_rows']} lignes, "
+                  f"{entry['n_rules']} règles) : p50 {entry['p50_change_pct']:+.1f} %")
+        failed = bool(regressions)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
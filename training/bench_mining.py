@@ -0,0 +1,128 @@
+# bench_mining.py
+"""
+Compare les moteurs d'extraction de mining.py (counting, apriori, fpgrowth,
+fpmax) : temps, pic mémoire et identité des résultats, pour choisir le
+moteur le moins coûteux des reconstructions nocturnes.
+
+    python bench_mining.py
+    python bench_mining.py --scales 1 10 30 --min-supports 0.001 0.0001 --skip-over 8000
+    python bench_mining.py --dataset ../data/synth_5M.csv --engines counting --output mining.json
+    python bench_mining.py --target recclass_clean
+    python bench_mining.py --encoding sparse
+
+Pour chaque taille de dataset (échelle > 1 : rééchantillonnage avec
+remise, ou un dataset synthétique, voir synthetic_data.py) et chaque
+min_support : itemsets fréquents + règles (confiance ≥ --min-confidence),
+pic mémoire Python/NumPy (tracemalloc) et vérification que les itemsets
+et règles (métriques comprises, au bit près) sont ceux du premier moteur.
+Avec --skip-over, un moteur dont le pic estimé dépasse ce seuil (Mo) n'est
+pas lancé. Résumé final : moteur le plus rapide et le plus sobre par
+configuration.
+"""
+import argparse
+import itertools
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from bench_engine import scale
+from mining import (ENCODINGS, ENGINES, METRIC_COLUMNS, encode_transactions, estimate_peak_bytes,
+                    mine_rules, peak_memory)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_DATASET_PATH = os.path.join(BASE_DIR, '..', 'data', 'meteorites_final_rebalanced.csv')
+
+COLUMNS = ["year_period", "mass_bin", "continent", "recclass_clean"]
+
+
+def same_result(reference, other):
+    """Mêmes itemsets (et supports) et mêmes règles, métriques identiques au bit près."""
+    (ref_itemsets, ref_rules), (itemsets, rules) = reference, other
+    if set(zip(ref_itemsets['itemsets'], ref_itemsets['support'])) != set(zip(itemsets['itemsets'], itemsets['support'])):
+        return False
+    if len(ref_rules) != len(rules):
+        return False
+    if ref_rules['antecedents'].tolist() != rules['antecedents'].tolist() or \
+            ref_rules['consequents'].tolist() != rules['consequents'].tolist():
+        return False
+    return all(np.array_equal(ref_rules[m].to_numpy(float), rules[m].to_numpy(float), equal_nan=True)
+               for m in METRIC_COLUMNS)
+
+
+def run(engine, df, min_support, min_confidence, target=None, encoding='dense'):
+    with peak_memory() as memory:
+        start = time.perf_counter()
+        result = mine_rules(df, COLUMNS, min_support, min_confidence, engine, target, encoding)
+        elapsed = time.perf_counter() - start
+    return result, elapsed, memory['peak']
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Moteurs d'extraction : counting, apriori, fpgrowth, fpmax")
+    parser.add_argument('--dataset', default=DEFAULT_DATASET_PATH)
+    parser.add_argument('--scales', type=float, nargs='+', default=[1.0, 10.0])
+    parser.add_argument('--min-supports', type=float, nargs='+', default=[1e-2, 1e-3, 1e-4, 1e-5])
+    parser.add_argument('--min-confidence', type=float, default=0.6)
+    parser.add_argument('--target', choices=COLUMNS, help="règles A → {target_X} seulement")
+    parser.add_argument('--encoding', choices=ENCODINGS, default='dense', help="one-hot des moteurs mlxtend")
+    parser.add_argument('--engines', nargs='+', choices=list(ENGINES), default=list(ENGINES))
+    parser.add_argument('--skip-over', type=float, help="ne pas lancer un moteur au pic estimé > SKIP_OVER Mo")
+    parser.add_argument('--output', help="fichier JSON des résultats")
+    args = parser.parse_args()
+
+    full_df = pd.read_csv(args.dataset, usecols=COLUMNS)
+    results = []
+    for dataset_scale, min_support in itertools.product(args.scales, args.min_supports):
+        df = scale(full_df, dataset_scale)
+        codes, vocab = encode_transactions(df, COLUMNS)
+        reference = None
+        for engine in args.engines:
+            estimate = estimate_peak_bytes(codes, vocab, min_support, engine, args.encoding)
+            entry = {
+                'engine': engine,
+                'dataset_rows': len(df),
+                'min_support': min_support,
+                'estimated_peak_mb': estimate / 1e6,
+            }
+            results.append(entry)
+            if args.skip_over is not None and estimate > args.skip_over * 1e6:
+                entry['skipped'] = True
+                print(f"{len(df):>9d} lignes  min_support {min_support:<8g} {engine:9s} "
+                      f"ignoré (pic estimé {estimate / 1e6:.0f} Mo)")
+                continue
+            result, elapsed, peak = run(engine, df, min_support, args.min_confidence, args.target,
+                                        args.encoding)
+            identical = True if reference is None else same_result(reference, result)
+            reference = reference or result
+            entry.update({
+                'itemsets': len(result[0]),
+                'rules': len(result[1]),
+                'seconds': elapsed,
+                'peak_mb': peak / 1e6,
+                'identical': identical,
+            })
+            print(f"{len(df):>9d} lignes  min_support {min_support:<8g} {engine:9s} "
+                  f"{entry['itemsets']:>6d} itemsets {entry['rules']:>6d} règles  "
+                  f"{elapsed:8.2f} s  pic {entry['peak_mb']:8.1f} Mo (estimé {entry['estimated_peak_mb']:.0f})"
+                  f"{'' if identical else '  ❌ résultat différent'}")
+
+    print("\nMoteur le moins coûteux par configuration :")
+    for (rows, min_support), group in itertools.groupby(results, key=lambda e: (e['dataset_rows'], e['min_support'])):
+        ran = [entry for entry in group if not entry.get('skipped')]
+        if ran:
+            fastest = min(ran, key=lambda e: e['seconds'])
+            leanest = min(ran, key=lambda e: e['peak_mb'])
+            print(f"{rows:>9d} lignes  min_support {min_support:<8g} temps : {fastest['engine']:9s} "
+                  f"mémoire : {leanest['engine']}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'columns': COLUMNS, 'min_confidence': args.min_confidence, 'target': args.target,
+                       'encoding': args.encoding, 'results': results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,634 @@
+# mining.py
+"""
+Extraction des règles d'association pour generate_rules.py.
+
+Les transactions sont des lignes à une valeur par colonne catégorielle
+(year_period, mass_bin, continent, recclass_clean) : un itemset fréquent
+est une combinaison de valeurs sur l'un des 2^k - 1 sous-ensembles de
+colonnes. Le moteur "counting" compte donc exactement chaque itemset par
+un group-by sur les codes entiers (un bincount par sous-ensemble de
+colonnes), sans encodage one-hot ni génération de candidats, puis calcule
+les règles et leurs métriques en vectorisé. Les moteurs de mlxtend
+(apriori, fpgrowth, fpmax) travaillent sur la matrice one-hot.
+
+Tous les moteurs renvoient les mêmes itemsets (format mlxtend : colonnes
+'support', 'itemsets', items nommés comme pd.get_dummies) et les mêmes
+règles (colonnes et formules de mlxtend.association_rules) ; mine_rules()
+les range dans un ordre canonique.
+
+Avec une colonne cible (recclass_clean pour le serveur), seules les
+règles A → {cible} sont construites : antécédents sur les autres colonnes,
+confiance et lift par type à partir des effectifs joints avec la cible.
+
+Avec un répertoire de cache, les itemsets fréquents sont conservés sur
+disque par empreinte du contenu des colonnes minées : une nouvelle
+exécution sur les mêmes données à un min_support égal ou supérieur les
+filtre par support et ne recalcule que les règles.
+"""
+import contextlib
+import hashlib
+import itertools
+import os
+import pickle
+import sys
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+METRIC_COLUMNS = ['antecedent support', 'consequent support', 'support', 'confidence', 'lift',
+                  'representativity', 'leverage', 'conviction', 'zhangs_metric', 'jaccard',
+                  'certainty', 'kulczynski']
+
+# Au-delà, les clés d'un sous-ensemble de colonnes sont comptées par tri
+# (np.unique) plutôt que par un tableau dense de compteurs (np.bincount)
+MAX_DENSE_KEYS = 1 << 24
+
+ENCODINGS = ('dense', 'sparse')
+
+# Mémoire de travail par ligne d'un paquet (mesurée avec tracemalloc) :
+# factorize d'une colonne de chaînes, clés int64 d'un sous-ensemble de colonnes
+ENCODE_BYTES_PER_ROW = 64
+COUNT_BYTES_PER_ROW = 16
+# Nœud d'arbre FP de mlxtend (objet Python, dict d'enfants compris)
+FP_NODE_BYTES = 400
+
+
+class MemoryBudgetExceeded(MemoryError):
+    """Extraction dont le pic estimé dépasse le budget mémoire (on_budget='abort')."""
+
+# -----------------------------
+# Encodage en codes entiers
+# -----------------------------
+def encode_transactions(df, columns, chunk_rows=None):
+    """
+    Codes entiers (lignes x colonnes, int32) et noms des items par colonne,
+    triés comme les colonnes de pd.get_dummies ('mass_bin_1-10g'...).
+    Les lignes incomplètes sont ignorées. Colonne par colonne et par paquets
+    de chunk_rows lignes (None : en une fois), sans copie du DataFrame.
+    """
+    n = len(df)
+    step = chunk_rows or max(n, 1)
+    codes = np.empty((n, len(columns)), dtype=np.int32)
+    vocab = []
+    for j, column in enumerate(columns):
+        # Codes provisoires dans l'ordre d'apparition, puis renumérotés dans l'ordre trié
+        seen = {}
+        for start in range(0, n, step):
+            values, uniques = pd.factorize(df[column].iloc[start:start + step])
+            mapping = np.array([seen.setdefault(value, len(seen)) for value in uniques] + [-1], dtype=np.int32)
+            codes[start:start + step, j] = mapping[values]
+        ordered = sorted(seen)
+        rank = np.empty(len(seen) + 1, dtype=np.int32)
+        rank[[seen[value] for value in ordered]] = np.arange(len(ordered))
+        rank[-1] = -1
+        codes[:, j] = rank[codes[:, j]]
+        vocab.append(np.array([f"{column}_{value}" for value in ordered], dtype=object))
+    complete = (codes >= 0).all(axis=1)
+    return (codes if complete.all() else codes[complete]), vocab
+
+
+def one_hot(codes, vocab, sparse=False):
+    """
+    Matrice one-hot des transactions (colonnes et ordre de pd.get_dummies),
+    construite depuis les codes sans passer par les chaînes. Avec sparse=True,
+    DataFrame creux (SparseDtype bool) : ~5 octets par ligne et par colonne
+    catégorielle au lieu d'un octet par ligne et par item.
+    """
+    n, k = codes.shape
+    offsets = np.concatenate([[0], np.cumsum([len(items) for items in vocab])])
+    names = np.concatenate(vocab) if vocab else np.empty(0, dtype=object)
+    positions = codes + offsets[:-1].astype(codes.dtype)
+    if sparse:
+        from scipy import sparse as sp
+
+        rows = np.repeat(np.arange(n, dtype=np.int32), k)
+        matrix = sp.csr_matrix((np.ones(n * k, dtype=bool), (rows, positions.ravel())),
+                               shape=(n, len(names)))
+        return pd.DataFrame.sparse.from_spmatrix(matrix, columns=names)
+    dense = np.zeros((n, len(names)), dtype=bool)
+    dense[np.arange(n)[:, None], positions] = True
+    return pd.DataFrame(dense, columns=names)
+
+# -----------------------------
+# Comptage exact des itemsets
+# -----------------------------
+def _count_keys(codes, subset, shape, chunk_rows=None):
+    """
+    (clés présentes triées, effectifs) de l'itemset de chaque ligne sur
+    subset, par paquets de chunk_rows lignes (None : en une fois).
+    """
+    n_keys = int(np.prod(shape))
+    step = chunk_rows or max(len(codes), 1)
+    chunks = (codes[start:start + step] for start in range(0, len(codes), step))
+    if n_keys <= MAX_DENSE_KEYS:
+        counts = np.zeros(n_keys, dtype=np.int64)
+        for part in chunks:
+            counts += np.bincount(np.ravel_multi_index(tuple(part[:, j] for j in subset), shape),
+                                  minlength=n_keys)
+        present = np.flatnonzero(counts)
+        return present, counts[present]
+    keys, counts = np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    for part in chunks:
+        part_keys, part_counts = np.unique(np.ravel_multi_index(tuple(part[:, j] for j in subset), shape),
+                                           return_counts=True)
+        keys, inverse = np.unique(np.concatenate([keys, part_keys]), return_inverse=True)
+        counts = np.bincount(inverse, weights=np.concatenate([counts, part_counts])).astype(np.int64)
+    return keys, counts
+
+
+def count_itemset_tables(codes, vocab, min_support, chunk_rows=None):
+    """
+    Itemsets fréquents par sous-ensemble de colonnes :
+    {(j1, j2, ...): (clés triées, support)}, la clé étant l'indice
+    ravel_multi_index des codes de l'itemset sur ces colonnes.
+    chunk_rows borne la mémoire de travail (comptage par paquets de lignes).
+    """
+    n = len(codes)
+    dims = [len(items) for items in vocab]
+    tables = {}
+    for size in range(1, len(vocab) + 1):
+        for subset in itertools.combinations(range(len(vocab)), size):
+            keys, counts = _count_keys(codes, subset, [dims[j] for j in subset], chunk_rows)
+            support = counts / n
+            keep = support >= min_support
+            tables[subset] = (keys[keep], support[keep])
+    return tables
+
+
+def _itemset_codes(vocab, subset, keys):
+    """Codes (m x len(subset)) des itemsets d'un sous-ensemble de colonnes."""
+    shape = [len(vocab[j]) for j in subset]
+    return np.stack(np.unravel_index(keys, shape), axis=1) if len(keys) else np.empty((0, len(subset)), int)
+
+
+def _level_columns(tables, vocab, size):
+    """
+    Itemsets fréquents de taille size en indices de colonnes one-hot,
+    triés lexicographiquement comme apriori, et leurs supports.
+    """
+    offsets = np.concatenate([[0], np.cumsum([len(items) for items in vocab])])
+    blocks = [(subset, keys, support) for subset, (keys, support) in tables.items()
+              if len(subset) == size and len(keys)]
+    if not blocks:
+        return np.empty((0, size), dtype=int), np.empty(0)
+    columns = np.concatenate([_itemset_codes(vocab, subset, keys) + offsets[list(subset)]
+                              for subset, keys, _ in blocks])
+    support = np.concatenate([s for _, _, s in blocks])
+    order = np.lexsort(columns.T[::-1])
+    return columns[order], support[order]
+
+
+def tables_to_itemsets(tables, vocab):
+    """Itemsets au format de mlxtend.apriori(use_colnames=True), dans le même ordre."""
+    names = np.concatenate(vocab) if vocab else np.empty(0, dtype=object)
+    supports, itemsets = [], []
+    for size in range(1, len(vocab) + 1):
+        columns, support = _level_columns(tables, vocab, size)
+        supports.append(support)
+        itemsets.extend(frozenset(names[row]) for row in columns)
+    support = np.concatenate(supports) if supports else np.empty(0)
+    return pd.DataFrame({'support': support, 'itemsets': itemsets})
+
+
+def count_frequent_itemsets(df, columns, min_support):
+    """Équivalent exact de apriori(pd.get_dummies(df[columns].dropna()), min_support, use_colnames=True)."""
+    codes, vocab = encode_transactions(df, columns)
+    return tables_to_itemsets(count_itemset_tables(codes, vocab, min_support), vocab)
+
+# -----------------------------
+# Règles et métriques
+# -----------------------------
+def rule_metrics(sAC, sA, sC):
+    """Métriques de mlxtend.association_rules (transactions complètes), mêmes formules."""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        confidence = sAC / sA
+        leverage = sAC - sA * sC
+        conviction = np.full(confidence.shape, np.inf)
+        below = confidence < 1.0
+        conviction[below] = (1.0 - sC[below]) / (1.0 - confidence[below])
+        zhang_denominator = np.maximum(sAC * (1 - sA), sA * (sC - sAC))
+        certainty_denominator = 1 - sC
+        return {
+            'antecedent support': sA,
+            'consequent support': sC,
+            'support': sAC,
+            'confidence': confidence,
+            'lift': confidence / sC,
+            'representativity': np.ones(len(sAC)),
+            'leverage': leverage,
+            'conviction': conviction,
+            'zhangs_metric': np.where(zhang_denominator == 0, 0, leverage / zhang_denominator),
+            'jaccard': sAC / (sA + sC - sAC),
+            'certainty': np.where(certainty_denominator == 0, 0,
+                                  (confidence - sC) / certainty_denominator),
+            'kulczynski': (sAC / sA + sAC / sC) / 2,
+        }
+
+
+def _lookup_support(tables, vocab, subset, codes):
+    """Support des itemsets (codes sur subset) ; présents par fermeture descendante."""
+    keys, support = tables[subset]
+    shape = [len(vocab[j]) for j in subset]
+    return support[np.searchsorted(keys, np.ravel_multi_index(tuple(codes.T), shape))]
+
+
+def tables_to_rules(tables, vocab, min_confidence):
+    """
+    Toutes les règles A → C (A ∪ C fréquent, A et C non vides) de confiance
+    ≥ min_confidence, comme association_rules(metric="confidence").
+    """
+    antecedents, consequents, blocks = [], [], []
+    for subset, (keys, sAC) in tables.items():
+        if len(subset) < 2 or not len(keys):
+            continue
+        codes = _itemset_codes(vocab, subset, keys)
+        for size in range(len(subset) - 1, 0, -1):
+            for positions in itertools.combinations(range(len(subset)), size):
+                rest = [p for p in range(len(subset)) if p not in positions]
+                a_subset = tuple(subset[p] for p in positions)
+                c_subset = tuple(subset[p] for p in rest)
+                sA = _lookup_support(tables, vocab, a_subset, codes[:, list(positions)])
+                sC = _lookup_support(tables, vocab, c_subset, codes[:, rest])
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    keep = sAC / sA >= min_confidence
+                if not keep.any():
+                    continue
+                for row in codes[keep]:
+                    antecedents.append(frozenset(vocab[j][row[p]] for j, p in zip(a_subset, positions)))
+                    consequents.append(frozenset(vocab[j][row[p]] for j, p in zip(c_subset, rest)))
+                blocks.append((sAC[keep], sA[keep], sC[keep]))
+    return _rules_frame(antecedents, consequents, blocks)
+
+
+def tables_to_target_rules(tables, vocab, target, min_confidence):
+    """
+    Règles A → {cible} seulement : pour chaque sous-ensemble de colonnes
+    sans la colonne cible (indice target), effectifs joints avec la cible.
+    Mêmes règles et métriques que tables_to_rules restreint aux conséquents
+    réduits à un item de la cible, sans énumérer les autres.
+    """
+    antecedents, consequents, blocks = [], [], []
+    others = [j for j in range(len(vocab)) if j != target]
+    target_keys, target_support = tables[(target,)]
+    for size in range(1, len(others) + 1):
+        for a_subset in itertools.combinations(others, size):
+            subset = tuple(sorted(a_subset + (target,)))
+            keys, sAC = tables[subset]
+            if not len(keys):
+                continue
+            codes = _itemset_codes(vocab, subset, keys)
+            t = subset.index(target)
+            positions = [p for p in range(len(subset)) if p != t]
+            sA = _lookup_support(tables, vocab, a_subset, codes[:, positions])
+            sC = target_support[np.searchsorted(target_keys, codes[:, t])]
+            keep = sAC / sA >= min_confidence
+            if not keep.any():
+                continue
+            for row in codes[keep]:
+                antecedents.append(frozenset(vocab[j][row[p]] for j, p in zip(a_subset, positions)))
+                consequents.append(frozenset([vocab[target][row[t]]]))
+            blocks.append((sAC[keep], sA[keep], sC[keep]))
+    return _rules_frame(antecedents, consequents, blocks)
+
+
+def _rules_frame(antecedents, consequents, blocks):
+    rules = pd.DataFrame({'antecedents': antecedents, 'consequents': consequents},
+                         columns=['antecedents', 'consequents'])
+    if not blocks:
+        return rules.reindex(columns=['antecedents', 'consequents'] + METRIC_COLUMNS)
+    sAC, sA, sC = (np.concatenate(parts) for parts in zip(*blocks))
+    for name, values in rule_metrics(sAC, sA, sC).items():
+        rules[name] = values
+    return rules
+
+
+def target_rules(rules, items):
+    """Règles dont le conséquent est un seul item parmi items (ceux de la colonne cible)."""
+    items = set(items)
+    keep = [len(c) == 1 and next(iter(c)) in items for c in rules['consequents']]
+    return rules[np.array(keep, dtype=bool)].reset_index(drop=True)
+
+
+def sort_rules(rules):
+    """Ordre canonique (antécédents puis conséquents triés) : rend les moteurs comparables."""
+    key = [(tuple(sorted(map(str, a))), tuple(sorted(map(str, c))))
+           for a, c in zip(rules['antecedents'], rules['consequents'])]
+    order = sorted(range(len(key)), key=key.__getitem__)
+    return rules.iloc[order].reset_index(drop=True)
+
+# -----------------------------
+# Budget mémoire
+# -----------------------------
+def _counting_bytes(vocab):
+    """(octets par ligne de paquet, octets fixes) du comptage : clés int64, compteurs denses."""
+    largest = max((int(np.prod([len(vocab[j]) for j in subset]))
+                   for size in range(1, len(vocab) + 1)
+                   for subset in itertools.combinations(range(len(vocab)), size)), default=0)
+    return COUNT_BYTES_PER_ROW, 16 * min(largest, MAX_DENSE_KEYS)
+
+
+def _chunk_rows(n_rows, per_row, room):
+    """Lignes par paquet pour tenir dans room octets (None : tout d'un bloc)."""
+    if n_rows * per_row <= room:
+        return None
+    return max(1, int(room // per_row))
+
+
+def apriori_candidates(tables, vocab):
+    """
+    Nombre de candidats qu'apriori évalue à chaque taille (2, 3...), déduit
+    des itemsets fréquents comptés : mêmes combinaisons que mlxtend.
+    """
+    from mlxtend.frequent_patterns.apriori import generate_new_combinations
+
+    candidates = {}
+    for size in range(1, len(vocab)):
+        columns, _ = _level_columns(tables, vocab, size)
+        if not len(columns):
+            break
+        flat = np.fromiter(generate_new_combinations(columns), dtype=int)
+        candidates[size + 1] = len(flat) // (size + 1)
+    return candidates
+
+
+def estimate_peak_bytes(codes, vocab, min_support, engine='counting', encoding='dense', chunk_rows=None):
+    """
+    Estimation du pic mémoire d'une extraction, codes des transactions compris.
+    apriori : matrice one-hot + évaluation d'un bloc des candidats de la
+    taille la plus coûteuse (lignes x candidats x (taille + 2) octets :
+    colonnes extraites, np.all et copie), poste dominant.
+    fpgrowth / fpmax : matrice one-hot + arbre FP.
+    """
+    n, k = codes.shape
+    if engine == 'counting':
+        per_row, fixed = _counting_bytes(vocab)
+        return codes.nbytes + fixed + per_row * min(n, chunk_rows or n)
+    n_items = sum(len(items) for items in vocab)
+    one_hot_bytes = n * k * 14 if encoding == 'sparse' else n * n_items
+    if engine in ('fpgrowth', 'fpmax'):
+        # Arbre FP : au plus une branche par transaction distincte ; mlxtend
+        # relit la matrice en dense (df.values), copie si elle est creuse
+        distinct = len(_count_keys(codes, tuple(range(k)), [len(items) for items in vocab], chunk_rows)[0])
+        densified = n * n_items if encoding == 'sparse' else 0
+        return codes.nbytes + one_hot_bytes + densified + distinct * k * FP_NODE_BYTES
+    tables = count_itemset_tables(codes, vocab, min_support, chunk_rows)
+    levels = max((n * count * (size + 2) for size, count in apriori_candidates(tables, vocab).items()),
+                 default=0)
+    return codes.nbytes + one_hot_bytes + levels
+
+
+def _within_budget(codes, vocab, min_support, engine, encoding, memory_budget, on_budget):
+    """
+    Moteur et options respectant memory_budget (octets) : le moteur demandé
+    s'il tient, sinon le comptage exact, par paquets de lignes si besoin
+    (on_budget='chunk'), ou MemoryBudgetExceeded (on_budget='abort').
+    """
+    options = {} if engine == 'counting' else {'encoding': encoding}
+    if memory_budget is None:
+        return engine, options
+    per_row, fixed = _counting_bytes(vocab)
+    room = memory_budget - codes.nbytes - fixed
+    if room < per_row:
+        raise MemoryBudgetExceeded(f"budget {memory_budget / 1e6:.0f} Mo insuffisant même par paquets")
+    chunk_rows = _chunk_rows(len(codes), per_row, room)
+    if engine == 'counting':
+        return engine, {'chunk_rows': chunk_rows}
+    estimate = estimate_peak_bytes(codes, vocab, min_support, engine, encoding, chunk_rows)
+    if estimate <= memory_budget:
+        return engine, options
+    message = f"pic estimé {estimate / 1e6:.0f} Mo pour {engine} ({encoding}) > budget {memory_budget / 1e6:.0f} Mo"
+    if on_budget == 'abort':
+        raise MemoryBudgetExceeded(message)
+    chunks = '' if chunk_rows is None else f" par paquets de {chunk_rows} lignes"
+    print(f"⚠️ {message} : comptage exact{chunks}", file=sys.stderr)
+    return 'counting', {'chunk_rows': chunk_rows}
+
+
+@contextlib.contextmanager
+def peak_memory():
+    """Pic des allocations Python/NumPy du bloc (tracemalloc), en octets dans stats['peak']."""
+    stats = {}
+    started = not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+    try:
+        yield stats
+    finally:
+        stats['peak'] = tracemalloc.get_traced_memory()[1]
+        if started:
+            tracemalloc.stop()
+
+# -----------------------------
+# Moteurs
+# -----------------------------
+def mine_rules_counting(codes, vocab, min_support, min_confidence, target=None, chunk_rows=None):
+    """Itemsets fréquents et règles par comptage exact (group-by sur codes entiers)."""
+    tables = count_itemset_tables(codes, vocab, min_support, chunk_rows)
+    if target is not None:
+        rules = tables_to_target_rules(tables, vocab, target, min_confidence)
+    else:
+        rules = tables_to_rules(tables, vocab, min_confidence)
+    return tables_to_itemsets(tables, vocab), rules
+
+
+def _complete_supports(maximal, codes, vocab):
+    """
+    Tous les itemsets fréquents (sous-ensembles des itemsets maximaux) et
+    leurs supports, recomptés sur les codes pour les sous-ensembles de
+    colonnes concernés : fpmax ne donne le support que des maximaux.
+    """
+    position = {name: (j, code) for j, items in enumerate(vocab) for code, name in enumerate(items)}
+    by_subset = {}
+    for itemset in maximal:
+        items = sorted(position[name] for name in itemset)
+        for size in range(1, len(items) + 1):
+            for combination in itertools.combinations(items, size):
+                subset = tuple(j for j, _ in combination)
+                by_subset.setdefault(subset, set()).add(tuple(code for _, code in combination))
+
+    supports, itemsets = [], []
+    for subset, values in by_subset.items():
+        shape = [len(vocab[j]) for j in subset]
+        keys, counts = _count_keys(codes, subset, shape)
+        values = sorted(values)
+        wanted = np.ravel_multi_index(tuple(np.array(values).T), shape)
+        supports.append(counts[np.searchsorted(keys, wanted)] / len(codes))
+        itemsets.extend(frozenset(vocab[j][code] for j, code in zip(subset, value)) for value in values)
+    support = np.concatenate(supports) if supports else np.empty(0)
+    return pd.DataFrame({'support': support, 'itemsets': itemsets})
+
+
+def _mlxtend_rules(itemsets, vocab, min_confidence, target):
+    from mlxtend.frequent_patterns import association_rules
+
+    if itemsets.empty:
+        return pd.DataFrame(columns=['antecedents', 'consequents'] + METRIC_COLUMNS)
+    rules = association_rules(itemsets, metric="confidence", min_threshold=min_confidence)
+    return rules if target is None else target_rules(rules, vocab[target])
+
+
+def mine_rules_apriori(codes, vocab, min_support, min_confidence, target=None, encoding='dense'):
+    """Chemin historique : one-hot (dense ou creux), mlxtend apriori puis association_rules."""
+    from mlxtend.frequent_patterns import apriori
+
+    encoded = one_hot(codes, vocab, sparse=encoding == 'sparse')
+    itemsets = apriori(encoded, min_support=min_support, use_colnames=True)
+    del encoded
+    return itemsets, _mlxtend_rules(itemsets, vocab, min_confidence, target)
+
+
+def mine_rules_fpgrowth(codes, vocab, min_support, min_confidence, target=None, encoding='dense'):
+    """FP-growth de mlxtend : un arbre FP au lieu des candidats d'apriori."""
+    from mlxtend.frequent_patterns import fpgrowth
+
+    encoded = one_hot(codes, vocab, sparse=encoding == 'sparse')
+    itemsets = fpgrowth(encoded, min_support=min_support, use_colnames=True)
+    del encoded
+    return itemsets, _mlxtend_rules(itemsets, vocab, min_confidence, target)
+
+
+def mine_rules_fpmax(codes, vocab, min_support, min_confidence, target=None, encoding='dense'):
+    """FP-max de mlxtend (itemsets maximaux), supports des sous-ensembles recomptés."""
+    from mlxtend.frequent_patterns import fpmax
+
+    encoded = one_hot(codes, vocab, sparse=encoding == 'sparse')
+    maximal = fpmax(encoded, min_support=min_support, use_colnames=True)
+    del encoded
+    itemsets = _complete_supports(maximal['itemsets'], codes, vocab)
+    return itemsets, _mlxtend_rules(itemsets, vocab, min_confidence, target)
+
+
+# Interface commune : moteur(codes, vocab, min_support, min_confidence, target, **options)
+# -> (itemsets fréquents au format mlxtend, règles au format association_rules)
+ENGINES = {
+    'counting': mine_rules_counting,
+    'apriori': mine_rules_apriori,
+    'fpgrowth': mine_rules_fpgrowth,
+    'fpmax': mine_rules_fpmax,
+}
+
+
+def sort_itemsets(itemsets):
+    """Ordre canonique des itemsets (taille puis items triés), quel que soit le moteur."""
+    key = [(len(itemset), tuple(sorted(map(str, itemset)))) for itemset in itemsets['itemsets']]
+    order = sorted(range(len(key)), key=key.__getitem__)
+    return itemsets.iloc[order].reset_index(drop=True)
+
+
+# -----------------------------
+# Cache des itemsets fréquents
+# -----------------------------
+def dataset_digest(df, columns):
+    """Empreinte du contenu des colonnes minées (noms, valeurs, ordre des lignes)."""
+    digest = hashlib.sha256('\x1f'.join(columns).encode('utf-8'))
+    digest.update(pd.util.hash_pandas_object(df[columns], index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def itemsets_to_tables(itemsets, vocab):
+    """
+    Inverse de tables_to_itemsets : {(j1, j2, ...): (clés triées, support)}
+    pour tous les sous-ensembles de colonnes, vides compris.
+    """
+    position = {name: (j, code) for j, items in enumerate(vocab) for code, name in enumerate(items)}
+    by_subset = {}
+    for itemset, support in zip(itemsets['itemsets'], itemsets['support']):
+        items = sorted(position[name] for name in itemset)
+        subset = tuple(j for j, _ in items)
+        by_subset.setdefault(subset, []).append((tuple(code for _, code in items), support))
+
+    tables = {}
+    for size in range(1, len(vocab) + 1):
+        for subset in itertools.combinations(range(len(vocab)), size):
+            entries = by_subset.get(subset, [])
+            if not entries:
+                tables[subset] = (np.empty(0, dtype=np.int64), np.empty(0))
+                continue
+            shape = [len(vocab[j]) for j in subset]
+            keys = np.ravel_multi_index(tuple(np.array([c for c, _ in entries]).T), shape)
+            support = np.array([s for _, s in entries], dtype=float)
+            order = np.argsort(keys)
+            tables[subset] = (keys[order], support[order])
+    return tables
+
+
+def _cache_path(cache_dir, digest):
+    return os.path.join(cache_dir, f"{digest}.pkl")
+
+
+def load_cached_itemsets(cache_dir, digest, min_support):
+    """
+    (itemsets de support ≥ min_support, vocab) si le cache contient ces
+    données minées à un min_support inférieur ou égal, sinon None.
+    """
+    path = _cache_path(cache_dir, digest)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'rb') as f:
+        entry = pickle.load(f)
+    if entry['min_support'] > min_support:
+        return None
+    itemsets = entry['itemsets']
+    return itemsets[itemsets['support'] >= min_support].reset_index(drop=True), entry['vocab']
+
+
+def save_cached_itemsets(cache_dir, digest, min_support, itemsets, vocab):
+    """Écrit les itemsets, sauf si le cache couvre déjà un min_support plus bas."""
+    path = _cache_path(cache_dir, digest)
+    if os.path.exists(path):
+        with open(path, 'rb') as f:
+            if pickle.load(f)['min_support'] <= min_support:
+                return
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        pickle.dump({'min_support': min_support, 'vocab': vocab, 'itemsets': itemsets}, f)
+    os.replace(tmp_path, path)
+
+
+def rules_from_itemsets(itemsets, vocab, min_confidence, target=None):
+    """Règles des itemsets fréquents (même calcul que le moteur counting)."""
+    tables = itemsets_to_tables(itemsets, vocab)
+    if target is not None:
+        return tables_to_target_rules(tables, vocab, target, min_confidence)
+    return tables_to_rules(tables, vocab, min_confidence)
+
+
+def mine_rules(df, columns, min_support, min_confidence, engine='counting', target=None,
+               encoding='dense', memory_budget=None, on_budget='chunk', cache_dir=None):
+    """
+    (itemsets fréquents, règles) dans un ordre canonique avec le moteur demandé.
+    Avec target (ex: 'recclass_clean'), seulement les règles A → {target_X},
+    A sur les autres colonnes. encoding : one-hot 'dense' ou 'sparse' des
+    moteurs mlxtend. memory_budget (octets) : encodage par paquets si
+    besoin, puis voir _within_budget. cache_dir : itemsets repris du cache
+    pour les mêmes données à un min_support ≤ celui demandé (sans
+    extraction), sinon extraits puis mis en cache.
+    """
+    if target is not None and target not in columns:
+        raise ValueError(f"Colonne cible absente des colonnes minées : {target}")
+    if cache_dir is not None:
+        digest = dataset_digest(df, columns)
+        cached = load_cached_itemsets(cache_dir, digest, min_support)
+        if cached is not None:
+            itemsets, vocab = cached
+            print(f"♻️ Itemsets repris du cache ({digest[:12]}) : extraction sautée", file=sys.stderr)
+            target = None if target is None else columns.index(target)
+            return itemsets, sort_rules(rules_from_itemsets(itemsets, vocab, min_confidence, target))
+    encode_chunk = None
+    if memory_budget is not None:
+        codes_bytes = len(df) * len(columns) * 4
+        if memory_budget - codes_bytes < ENCODE_BYTES_PER_ROW:
+            raise MemoryBudgetExceeded(f"budget {memory_budget / 1e6:.0f} Mo insuffisant : "
+                                       f"codes des transactions {codes_bytes / 1e6:.0f} Mo")
+        encode_chunk = _chunk_rows(len(df), ENCODE_BYTES_PER_ROW, memory_budget - codes_bytes)
+    codes, vocab = encode_transactions(df, columns, encode_chunk)
+    engine, options = _within_budget(codes, vocab, min_support, engine, encoding, memory_budget, on_budget)
+    target = None if target is None else columns.index(target)
+    itemsets, rules = ENGINES[engine](codes, vocab, min_support, min_confidence, target, **options)
+    itemsets = sort_itemsets(itemsets)
+    if cache_dir is not None:
+        save_cached_itemsets(cache_dir, digest, min_support, itemsets, vocab)
+    return itemsets, sort_rules(rules)
@@ -0,0 +1,1356 @@
+# rule_engine.py
+"""
+Moteur de prédiction par règles d'association, seule partie utilisée par
+le serveur (backend/app.py, asgi.py...) : dépend uniquement de NumPy et
+pandas (scipy chargé à la demande pour l'appariement en lot).
+
+REGLES.py ré-exporte l'API publique (__all__) et y ajoute la carte
+(folium) et l'évaluation des règles.
+"""
+
+import bisect
+import itertools
+import json
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+import pandas as pd
+import numpy as np
+
+# API publique : ce que REGLES.py ré-exporte par « from rule_engine import * »
+__all__ = [
+    # Règles et index
+    'is_geographic_tautology', 'is_type_prediction_rule', 'build_rule_index', 'match_rule_ids',
+    'match_rule_ids_batch', 'load_rule_store', 'build_year_period_table', 'periods_for_years',
+    # Étapes du moteur
+    'build_user_criteria', 'select_matched_rules', 'filter_rules', 'get_most_probable_type',
+    'predict_missing_criteria', 'get_type_info', 'get_rules_statistics',
+    # Mesures
+    'STAGES', 'LATENCY_BUCKETS', 'StageMetrics', 'merge_stage_metrics', 'StageRecorder',
+    'profile_user_selection', 'peak_rss_mb',
+    # Traitement des sélections et réponses
+    'DEFAULT_PAGE_SIZE', 'process_user_selection', 'process_user_selections', 'score_ndjson',
+    'format_prediction_response', 'normalize_selection', 'json_default',
+    'SelectionCache', 'cached_process_user_selection',
+]
+
+# -----------------------------
+# Filtrer les tautologies géographiques
+# -----------------------------
+def is_geographic_tautology(row):
+    """
+    Détecte les règles tautologiques comme {continent_X} → {country_X}
+    ou {country_X} → {continent_X}
+    """
+    antecedents = row['antecedents']
+    consequents = row['consequents']
+    
+    has_continent_ant = any('continent_' in str(item) for item in antecedents)
+    has_country_cons = any('country_' in str(item) for item in consequents)
+    has_country_ant = any('country_' in str(item) for item in antecedents)
+    has_continent_cons = any('continent_' in str(item) for item in consequents)
+    
+    return (has_continent_ant and has_country_cons) or (has_country_ant and has_continent_cons)
+
+# -----------------------------
+# Vérifier si règle prédit un type
+# -----------------------------
+def is_type_prediction_rule(row):
+    return any('recclass_clean_' in str(item) for item in row['consequents'])
+
+# -----------------------------
+# Index inversé des règles
+# -----------------------------
+_NO_RULES = np.empty(0, dtype=np.int32)
+
+def build_rule_index(rules):
+    """
+    Construit une seule fois (au chargement de rules.pkl) un index inversé
+    item one-hot -> tableau trié des positions des règles dont l'antécédent
+    contient cet item, ex: 'continent_Africa' -> [3, 17, 42, ...]
+    """
+    postings = {}
+    for rule_id, antecedents in enumerate(rules['antecedents']):
+        for item in set(str(item) for item in antecedents):
+            postings.setdefault(item, []).append(rule_id)
+
+    return {
+        'n_rules': len(rules),
+        'postings': {item: np.asarray(ids, dtype=np.int32) for item, ids in postings.items()},
+    }
+
+def match_rule_ids(rule_index, user_criteria, strict=False):
+    """
+    Positions (triées) des règles compatibles avec les critères utilisateur.
+    - strict : critères ⊆ antécédent -> intersection des listes de l'index
+    - non strict : au moins un critère commun -> union des listes
+    """
+    if not user_criteria:
+        return np.arange(rule_index['n_rules'], dtype=np.int32)
+
+    postings = [rule_index['postings'].get(item, _NO_RULES) for item in user_criteria]
+
+    if strict:
+        # Commencer par la liste la plus courte pour réduire les intersections
+        postings.sort(key=len)
+        ids = postings[0]
+        for other in postings[1:]:
+            if len(ids) == 0:
+                break
+            ids = np.intersect1d(ids, other, assume_unique=True)
+        return ids
+
+    return np.unique(np.concatenate(postings))
+
+def _antecedent_matrix(store):
+    """
+    Matrice creuse CSR règles x items des antécédents (1 si l'item est présent),
+    construite à la première utilisation puis conservée dans le store.
+    """
+    matrix = store.get('antecedent_matrix')
+    if matrix is None:
+        from scipy import sparse
+
+        postings = store['index']['postings']
+        items = sorted(postings)
+        rows = np.concatenate([postings[item] for item in items]) if items else _NO_RULES
+        cols = np.repeat(np.arange(len(items), dtype=np.int32), [len(postings[item]) for item in items])
+        matrix = sparse.csr_matrix(
+            (np.ones(len(rows), dtype=np.int32), (rows, cols)),
+            shape=(store['index']['n_rules'], len(items))
+        )
+        store['item_columns'] = {item: j for j, item in enumerate(items)}
+        store['antecedent_matrix'] = matrix
+    return matrix
+
+def match_rule_ids_batch(store, criteria_list):
+    """
+    Correspondance de plusieurs jeux de critères en un seul produit creux :
+    (sélections x items) @ (items x règles) donne le nombre de critères
+    présents dans chaque antécédent.
+    - strict : nombre == nombre de critères (critères ⊆ antécédent)
+    - non strict : nombre > 0
+    Renvoie une liste de couples (ids_stricts, ids_non_stricts), triés.
+    """
+    from scipy import sparse
+
+    matrix = _antecedent_matrix(store)
+    columns = store['item_columns']
+    n_rules = store['index']['n_rules']
+
+    indptr = [0]
+    indices = []
+    for criteria in criteria_list:
+        indices.extend(columns[item] for item in criteria if item in columns)
+        indptr.append(len(indices))
+    selections = sparse.csr_matrix(
+        (np.ones(len(indices), dtype=np.int32), np.asarray(indices, dtype=np.int32), indptr),
+        shape=(len(criteria_list), matrix.shape[1])
+    )
+    overlap = (selections @ matrix.T).tocsr()
+    overlap.sort_indices()
+
+    all_rules = np.arange(n_rules, dtype=np.int32)
+    matches = []
+    for i, criteria in enumerate(criteria_list):
+        if not criteria:
+            matches.append((all_rules, all_rules))
+            continue
+        start, end = overlap.indptr[i], overlap.indptr[i + 1]
+        rule_ids = overlap.indices[start:end].astype(np.int32)
+        counts = overlap.data[start:end]
+        matches.append((rule_ids[counts == len(criteria)], rule_ids[counts > 0]))
+    return matches
+
+# -----------------------------
+# Stockage colonnaire des règles
+# -----------------------------
+def _consequent_type(consequents):
+    """Nom du type (sans préfixe) prédit par un conséquent, ou None."""
+    for item in consequents:
+        if 'recclass_clean_' in str(item):
+            return str(item).replace('recclass_clean_', '')
+    return None
+
+def load_rule_store(rules):
+    """
+    Transforme le DataFrame de règles (rules.pkl) en stockage colonnaire.
+    Les tests ligne par ligne (tautologie géographique, règle de type) sont
+    faits une seule fois ici ; par requête il ne reste que du masquage NumPy.
+    Les règles sont réindexées 0..n-1 : l'index d'un sous-ensemble filtré
+    donne directement les positions dans les tableaux du stockage.
+    """
+    rules = rules.reset_index(drop=True)
+    records = rules[['antecedents', 'consequents']].to_dict('records')
+
+    type_names = []
+    type_codes = {}
+    type_id = np.full(len(rules), -1, dtype=np.int32)
+    for i, row in enumerate(records):
+        type_name = _consequent_type(row['consequents'])
+        if type_name is not None:
+            if type_name not in type_codes:
+                type_codes[type_name] = len(type_names)
+                type_names.append(type_name)
+            type_id[i] = type_codes[type_name]
+
+    return {
+        'rules': rules,
+        'index': build_rule_index(rules),
+        'is_type_rule': type_id >= 0,
+        'is_geo_tautology': np.fromiter((is_geographic_tautology(row) for row in records),
+                                        dtype=bool, count=len(records)),
+        'type_id': type_id,
+        'type_names': type_names,
+        'confidence': rules['confidence'].to_numpy(dtype=np.float64),
+        'lift': rules['lift'].to_numpy(dtype=np.float64),
+        'support': rules['support'].to_numpy(dtype=np.float64),
+    }
+
+# -----------------------------
+# Table année -> période
+# -----------------------------
+def build_year_period_table(df):
+    """
+    Table triée année -> item 'year_period_X', construite une fois par
+    chargement du dataset. Les années consécutives d'une même période sont
+    regroupées en segments pour résoudre une plage avec np.searchsorted.
+    Comme l'ancien dict(zip(...)), la dernière occurrence d'une année l'emporte.
+    """
+    known = df[['year', 'year_period']].dropna(subset=['year'])
+    known = known.drop_duplicates('year', keep='last').sort_values('year')
+
+    years = known['year'].to_numpy(dtype=np.float64)
+    items = [f'year_period_{period}' for period in known['year_period']]
+    item_names = list(dict.fromkeys(items))
+    item_codes = {item: code for code, item in enumerate(item_names)}
+    codes = np.fromiter((item_codes[item] for item in items), dtype=np.int32, count=len(items))
+
+    # Segment de chaque année : nouveau segment à chaque changement de période
+    starts = np.ones(len(codes), dtype=bool)
+    starts[1:] = codes[1:] != codes[:-1]
+    segment_of_year = np.cumsum(starts) - 1
+
+    return {
+        'years': years,
+        'segment_of_year': segment_of_year,
+        'segment_code': codes[starts],
+        'item_names': item_names,
+    }
+
+def _year_intervals(years):
+    """
+    Traduit l'entrée 'years' en intervalles fermés [low, high] :
+    [start, end] (plage si écart > 1), [[start, end], ...] ou années isolées.
+    """
+    lows, highs = [], []
+    # Détecter si c'est une plage [start, end] ou une liste d'années [1990, 1991, 1992]
+    if len(years) == 2 and all(isinstance(y, (int, float)) for y in years):
+        start_year, end_year = min(years), max(years)
+        if end_year - start_year > 1:  # C'est une plage
+            lows.append(start_year)
+            highs.append(end_year)
+        else:  # Ce sont juste deux années individuelles
+            lows.extend(years)
+            highs.extend(years)
+    else:
+        for y in years:
+            if isinstance(y, (list, tuple)) and len(y) == 2:
+                # Plage d'années explicite
+                lows.append(y[0])
+                highs.append(y[1])
+            elif isinstance(y, (int, float)):
+                lows.append(y)
+                highs.append(y)
+    return lows, highs
+
+def periods_for_years(year_table, lows, highs):
+    """
+    Ensemble des items 'year_period_X' couverts par les années connues du
+    dataset dans les intervalles [lows[i], highs[i]], en un seul appel vectorisé.
+    """
+    years = year_table['years']
+    lo = np.searchsorted(years, np.asarray(lows, dtype=np.float64), side='left')
+    hi = np.searchsorted(years, np.asarray(highs, dtype=np.float64), side='right')
+    hit = lo < hi
+    if not hit.any():
+        return set()
+
+    first = year_table['segment_of_year'][lo[hit]]
+    last = year_table['segment_of_year'][hi[hit] - 1]
+    lengths = last - first + 1
+    offsets = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    segments = np.repeat(first, lengths) + offsets
+
+    codes = np.unique(year_table['segment_code'][segments])
+    return {year_table['item_names'][code] for code in codes}
+
+# -----------------------------
+# Filtrer règles selon critères
+# -----------------------------
+def build_user_criteria(df, years=None, mass_bins=None, continents=None, year_table=None):
+    """
+    Items one-hot (year_period_*, mass_bin_*, continent_*) correspondant
+    aux critères utilisateur.
+    """
+    user_criteria = set()
+
+    # Années - convertir en format one-hot via la table année -> période
+    if years:
+        if year_table is None:
+            year_table = build_year_period_table(df)
+        lows, highs = _year_intervals(years)
+        user_criteria.update(periods_for_years(year_table, lows, highs))
+
+    # Mass bins
+    if mass_bins:
+        for m in mass_bins:
+            if isinstance(m, (list, tuple)) and len(m) == 2:
+                # Plage de masse: ajouter tous les mass_bins possibles
+                user_criteria.update([f'mass_bin_VS', f'mass_bin_S', f'mass_bin_M', 
+                                    f'mass_bin_L', f'mass_bin_VL'])
+            else:
+                user_criteria.add(f'mass_bin_{m}')
+
+    # Continents
+    if continents:
+        user_criteria.update(f'continent_{c}' for c in continents)
+
+    return user_criteria
+
+def select_matched_rules(store, ids):
+    """
+    Règles retenues parmi les positions 'ids' : sans tautologies
+    géographiques, règles de type en priorité, triées par confiance.
+    """
+    ids = ids[~store['is_geo_tautology'][ids]]
+    type_ids = ids[store['is_type_rule'][ids]]
+    if len(type_ids) > 0:
+        ids = type_ids
+    return store['rules'].iloc[ids].sort_values('confidence', ascending=False)
+
+# -----------------------------
+# CORRECTION DE LA FONCTION filter_rules
+# -----------------------------
+def filter_rules(rules, df, years=None, mass_bins=None, continents=None, strict=False,
+                 store=None, year_table=None):
+    """
+    CORRECTION: Ne pas utiliser issubset() qui est trop strict
+    Cherche les règles qui contiennent AU MOINS UN des critères
+    Si store (voir load_rule_store) est fourni, la correspondance se fait
+    par intersection/union sur l'index et le reste par masquage NumPy.
+    year_table (voir build_year_period_table) évite de reconstruire la
+    correspondance année -> période à chaque appel.
+    """
+    user_criteria = build_user_criteria(df, years, mass_bins, continents, year_table)
+
+    # CORRECTION PRINCIPALE: ne pas utiliser issubset() mais intersection()
+    def match_criteria_corrected(antecedents):
+        ant_set = set(str(item) for item in antecedents)
+        if not user_criteria:
+            return True
+        if strict:
+            return user_criteria.issubset(ant_set)
+        else:
+            return len(ant_set.intersection(user_criteria)) > 0
+
+    # Chemin rapide : index inversé + métadonnées précalculées
+    if store is not None:
+        return select_matched_rules(store, match_rule_ids(store['index'], user_criteria, strict))
+
+    # Appliquer le filtrage corrigé
+    filtered = rules[rules['antecedents'].apply(match_criteria_corrected)]
+    
+    # Éliminer les tautologies géographiques
+    filtered = filtered[~filtered.apply(is_geographic_tautology, axis=1)]
+    
+    # Prioriser les règles qui prédissent un type
+    type_rules = filtered[filtered.apply(is_type_prediction_rule, axis=1)]
+    
+    # CORRECTION: Si pas de règles de type, prendre quand même d'autres règles
+    # mais les trier par confiance
+    if not type_rules.empty:
+        return type_rules.sort_values('confidence', ascending=False)
+    else:
+        return filtered.sort_values('confidence', ascending=False)
+
+# -----------------------------
+# Obtenir le type le plus probable
+# -----------------------------
+def _score_types(filtered_rules, store=None):
+    """
+    Agrège en une passe, par type prédit : somme de confidence*lift, nombre
+    de règles, meilleure confidence et ordre de première apparition.
+    Les règles sont parcourues par confidence puis lift décroissants (tri
+    stable) pour que les sommes flottantes et les égalités soient identiques
+    à l'ancien parcours iterrows().
+    """
+    if store is not None:
+        positions = filtered_rules.index.to_numpy()
+        type_id = store['type_id'][positions]
+        confidence = store['confidence'][positions]
+        lift = store['lift'][positions]
+        type_names = store['type_names']
+    else:
+        type_codes = {}
+        type_id = np.full(len(filtered_rules), -1, dtype=np.int32)
+        for i, consequents in enumerate(filtered_rules['consequents']):
+            type_name = _consequent_type(consequents)
+            if type_name is not None:
+                type_id[i] = type_codes.setdefault(type_name, len(type_codes))
+        type_names = list(type_codes)
+        confidence = filtered_rules['confidence'].to_numpy(dtype=np.float64)
+        lift = filtered_rules['lift'].to_numpy(dtype=np.float64)
+
+    order = np.lexsort((-lift, -confidence))
+    type_id, confidence, lift = type_id[order], confidence[order], lift[order]
+    keep = type_id >= 0
+    type_id, confidence, lift = type_id[keep], confidence[keep], lift[keep]
+
+    n_types = len(type_names)
+    scores = np.bincount(type_id, weights=confidence * lift, minlength=n_types)
+    counts = np.bincount(type_id, minlength=n_types)
+    max_confidence = np.full(n_types, -np.inf)
+    np.maximum.at(max_confidence, type_id, confidence)
+    first_seen = np.full(n_types, len(type_id))
+    np.minimum.at(first_seen, type_id, np.arange(len(type_id)))
+
+    present = np.flatnonzero(counts > 0)
+    present = present[np.argsort(first_seen[present], kind='stable')]
+    return type_names, present, scores, counts, max_confidence
+
+def get_most_probable_type(filtered_rules, df, store=None, return_distribution=False):
+    """
+    Calcule le type le plus probable basé sur les règles filtrées.
+    Utilise un scoring qui favorise la confidence et le lift.
+    Avec return_distribution=True, renvoie aussi la distribution complète
+    des types classés par score (liste de dicts), sans passe supplémentaire.
+    """
+    distribution = []
+    has_type_rules = False
+
+    if not filtered_rules.empty:
+        type_names, present, scores, counts, max_confidence = _score_types(filtered_rules, store)
+        has_type_rules = len(present) > 0
+
+    if has_type_rules:
+        # Normaliser les scores pour éviter que les types avec beaucoup de règles dominent
+        # Score normalisé = score moyen par règle * boost pour confidence max
+        normalized_scores = scores[present] / counts[present] * (1 + max_confidence[present])
+
+        # En cas d'égalité, le premier type rencontré l'emporte (comme max() sur un dict)
+        top = present[np.argmax(normalized_scores)]
+        top_type = type_names[top]
+        
+        # Probabilité = meilleure confidence pour ce type
+        prob = max_confidence[top]
+        
+        # Bonus si plusieurs règles confirment
+        if counts[top] >= 3:
+            prob = min(prob * 1.1, 0.95)  # Boost de 10% si 3+ règles
+        elif counts[top] >= 5:
+            prob = min(prob * 1.15, 0.95)  # Boost de 15% si 5+ règles
+
+        if return_distribution:
+            for rank in np.argsort(-normalized_scores, kind='stable'):
+                t = present[rank]
+                distribution.append({
+                    'type': type_names[t],
+                    'score': float(normalized_scores[rank]),
+                    'rules': int(counts[t]),
+                    'max_confidence': float(max_confidence[t])
+                })
+            
+    else:
+        if not df.empty:
+            top_type = df['recclass_clean'].value_counts().idxmax()
+            prob = df['recclass_clean'].value_counts(normalize=True).max() * 0.6
+        else:
+            top_type = "Unknown"
+            prob = 0.0
+    
+    # Garantir une probabilité minimale raisonnable si on a des règles
+    if has_type_rules and prob < 0.3:
+        prob = 0.3
+    
+    if return_distribution:
+        return top_type, round(prob, 3), distribution
+    return top_type, round(prob, 3)
+
+
+
+
+
+# -----------------------------
+# Prédire valeurs manquantes
+# -----------------------------
+def predict_missing_criteria(df, top_type, user_years=None, user_mass=None, user_continents=None):
+    """
+    Prédit les critères manquants basés sur le type de météorite.
+    Retourne toujours des listes pour la cohérence.
+    """
+    df_type = df[df['recclass_clean'] == top_type].copy()
+    
+    # Filtrer par années si fournies
+    if user_years:
+        years_flat = []
+        # Détecter si c'est une plage [start, end]
+        if len(user_years) == 2 and all(isinstance(y, (int, float)) for y in user_years):
+            start_year, end_year = min(user_years), max(user_years)
+            if end_year - start_year > 1:
+                years_flat = list(range(int(start_year), int(end_year) + 1))
+            else:
+                years_flat = [int(y) for y in user_years]
+        else:
+            for y in user_years:
+                if isinstance(y, (list, tuple)) and len(y) == 2:
+                    years_flat.extend(range(int(y[0]), int(y[1]) + 1))
+                else:
+                    years_flat.append(int(y) if isinstance(y, float) else y)
+        df_type = df_type[df_type['year'].isin(years_flat)]
+    
+    # Filtrer par masse si fournie
+    if user_mass:
+        mass_mask = pd.Series(False, index=df_type.index)
+        mass_list = user_mass if isinstance(user_mass, list) else [user_mass]
+        for m in mass_list:
+            if isinstance(m, (list, tuple)) and len(m) == 2:
+                mass_mask |= df_type['mass_cleaned'].between(m[0], m[1])
+            else:
+                mass_mask |= (df_type['mass_bin'] == m)
+        df_type = df_type[mass_mask]
+    
+    # Filtrer par continents si fournis
+    if user_continents:
+        cont_list = user_continents if isinstance(user_continents, list) else [user_continents]
+        df_type = df_type[df_type['continent'].isin(cont_list)]
+    
+    # Prédictions - toujours retourner des listes normalisées
+    if user_years:
+        year_pred = user_years
+    elif not df_type.empty:
+        # Retourner la période la plus fréquente
+        year_pred = df_type['year_period'].mode()[0]
+    else:
+        year_pred = None
+    
+    if user_mass:
+        mass_pred = user_mass if isinstance(user_mass, list) else [user_mass]
+    elif not df_type.empty:
+        mass_pred = [df_type['mass_bin'].mode()[0]]
+    else:
+        mass_pred = None
+    
+    if user_continents:
+        continent_pred = user_continents if isinstance(user_continents, list) else [user_continents]
+    elif not df_type.empty:
+        continent_pred = [df_type['continent'].mode()[0]]
+    else:
+        continent_pred = None
+
+    return year_pred, mass_pred, continent_pred
+
+# -----------------------------
+# Infos selon critères
+# -----------------------------
+def get_type_info(df, top_type, user_years=None, user_mass=None, user_continents=None,
+                  pred_year=None, pred_mass=None, pred_continent=None,
+                  limit=None, offset=0, sample_seed=None):
+    """
+    Récupère les informations sur les météorites correspondant au type et aux critères.
+    Les critères UTILISATEUR sont OBLIGATOIRES et ne sont jamais assouplis.
+    limit: nombre max de noms / années renvoyés à partir de offset (None : tout),
+    dans l'ordre du dataset, ou dans un ordre aléatoire fixé par sample_seed.
+    Seules ces valeurs sont converties en objets Python.
+    """
+    # ÉTAPE 1: Commencer avec le type prédit
+    df_result = df[df['recclass_clean'] == top_type]
+    
+    # ÉTAPE 2: Appliquer les critères UTILISATEUR (OBLIGATOIRES - jamais assouplis)
+    if user_continents:
+        cont_list = user_continents if isinstance(user_continents, list) else [user_continents]
+        df_result = df_result[df_result['continent'].isin(cont_list)]
+    
+    if user_years:
+        years_flat = _extract_years(user_years)
+        if years_flat:
+            df_result = df_result[df_result['year'].isin(years_flat)]
+    
+    if user_mass:
+        mass_mask = pd.Series(False, index=df_result.index)
+        mass_list = user_mass if isinstance(user_mass, list) else [user_mass]
+        for m in mass_list:
+            if isinstance(m, (list, tuple)) and len(m) == 2:
+                mass_mask |= df_result['mass_cleaned'].between(m[0], m[1])
+            else:
+                mass_mask |= (df_result['mass_bin'] == m)
+        df_result = df_result[mass_mask]
+    
+    # ÉTAPE 3: Si vide après critères utilisateur, chercher DANS LE CONTINENT demandé avec un autre type
+    if df_result.empty and user_continents:
+        # Garder le continent mais ignorer le type
+        df_result = df
+        cont_list = user_continents if isinstance(user_continents, list) else [user_continents]
+        df_result = df_result[df_result['continent'].isin(cont_list)]
+        
+        # Appliquer les autres critères utilisateur si fournis
+        if user_years:
+            years_flat = _extract_years(user_years)
+            if years_flat:
+                df_temp = df_result[df_result['year'].isin(years_flat)]
+                if not df_temp.empty:
+                    df_result = df_temp
+        
+        if user_mass:
+            mass_mask = pd.Series(False, index=df_result.index)
+            mass_list = user_mass if isinstance(user_mass, list) else [user_mass]
+            for m in mass_list:
+                if isinstance(m, (list, tuple)) and len(m) == 2:
+                    mass_mask |= df_result['mass_cleaned'].between(m[0], m[1])
+                else:
+                    mass_mask |= (df_result['mass_bin'] == m)
+            df_temp = df_result[mass_mask]
+            if not df_temp.empty:
+                df_result = df_temp
+    
+    # ÉTAPE 4: Si l'utilisateur n'a PAS donné de continent, utiliser le continent PRÉDIT comme filtre
+    if not user_continents and pred_continent:
+        cont_list = pred_continent if isinstance(pred_continent, list) else [pred_continent]
+        df_temp = df_result[df_result['continent'].isin(cont_list)]
+        if not df_temp.empty:
+            df_result = df_temp
+    
+    # ÉTAPE 5: Si toujours vide, fallback sur le type seul avec continent prédit
+    if df_result.empty:
+        df_result = df[df['recclass_clean'] == top_type]
+        if pred_continent:
+            cont_list = pred_continent if isinstance(pred_continent, list) else [pred_continent]
+            df_temp = df_result[df_result['continent'].isin(cont_list)]
+            if not df_temp.empty:
+                df_result = df_temp
+
+    if limit is None:
+        names = df_result['name'].tolist() if not df_result.empty else []
+        sample_years = df_result['year'].dropna().tolist() if not df_result.empty else []
+    else:
+        names = _page_values(df_result['name'], offset, limit, sample_seed)
+        sample_years = _page_values(df_result['year'].dropna(), offset, limit, sample_seed)
+    countries = df_result['country'].dropna().unique().tolist() if not df_result.empty else []
+    mass_bin = df_result['mass_bin'].mode()[0] if not df_result.empty and len(df_result['mass_bin'].mode()) > 0 else None
+
+    return names, countries, sample_years, mass_bin, df_result
+
+
+def _page_values(values, offset, limit, sample_seed=None):
+    """Valeurs [offset, offset + limit) d'une Series, ordre du dataset ou permutation seedée."""
+    if sample_seed is None:
+        return values.iloc[offset:offset + limit].tolist()
+    positions = np.random.default_rng(sample_seed).permutation(len(values))
+    return values.iloc[positions[offset:offset + limit]].tolist()
+
+
+def _extract_years(years_input):
+    """
+    Extrait une liste d'années à partir de différents formats d'entrée.
+    Gère: [1994, 2006], [[1994, 2006]], [(1994, 2006)], "20th Century", etc.
+    """
+    if years_input is None:
+        return []
+    
+    # Si c'est une période (string)
+    if isinstance(years_input, str):
+        return []  # Sera traité par year_period
+    
+    years_flat = []
+    
+    # Si c'est une liste
+    if isinstance(years_input, list):
+        # Cas: [[1994, 2006]] ou [(1994, 2006)] - liste contenant une plage
+        if len(years_input) == 1 and isinstance(years_input[0], (list, tuple)) and len(years_input[0]) == 2:
+            start, end = years_input[0]
+            years_flat = list(range(int(start), int(end) + 1))
+        # Cas: [1994, 2006] - pourrait être une plage ou deux années
+        elif len(years_input) == 2 and all(isinstance(y, (int, float)) for y in years_input):
+            start, end = min(years_input), max(years_input)
+            if end - start > 1:  # C'est une plage
+                years_flat = list(range(int(start), int(end) + 1))
+            else:  # Deux années individuelles
+                years_flat = [int(y) for y in years_input]
+        # Cas: liste d'années ou de plages
+        else:
+            for y in years_input:
+                if isinstance(y, (list, tuple)) and len(y) == 2:
+                    years_flat.extend(range(int(y[0]), int(y[1]) + 1))
+                elif isinstance(y, (int, float)):
+                    years_flat.append(int(y))
+    
+    return years_flat
+
+# -----------------------------
+# Statistiques de qualité des règles
+# -----------------------------
+def get_rules_statistics(filtered_rules, store=None):
+    if filtered_rules.empty:
+        return {
+            'total': 0,
+            'type_rules': 0,
+            'geo_rules': 0,
+            'mean_confidence': 0,
+            'mean_lift': 0
+        }
+    
+    if store is not None:
+        n_type_rules = int(store['is_type_rule'][filtered_rules.index.to_numpy()].sum())
+    else:
+        n_type_rules = len(filtered_rules[filtered_rules.apply(is_type_prediction_rule, axis=1)])
+    
+    return {
+        'total': len(filtered_rules),
+        'type_rules': n_type_rules,
+        'geo_rules': len(filtered_rules) - n_type_rules,
+        'mean_confidence': filtered_rules['confidence'].mean(),
+        'mean_lift': filtered_rules['lift'].mean()
+    }
+
+# -----------------------------
+# Mesures par étape (histogrammes cumulés)
+# -----------------------------
+STAGES = ('filter_strict', 'filter_loose', 'most_probable_type',
+          'predict_missing_criteria', 'get_type_info')
+
+# Bornes des histogrammes de latence, en secondes
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+
+class StageMetrics:
+    """
+    Latences cumulées par étape de process_user_selection (histogrammes au
+    format Prometheus), règles retenues et lignes du dataset parcourues.
+    Une observation coûte un bisect et une prise de verrou.
+
+    Compteurs dans un seul tableau float64 : en mémoire, ou dans un fichier
+    .npy mappé (path) pour qu'un autre processus les additionne (voir
+    merge_stage_metrics) ; un fichier par processus, jamais partagé.
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS, path=None):
+        self.buckets = tuple(buckets)
+        self.path = path
+        # Par étape : compteurs des tranches (+Inf compris), somme, règles, lignes
+        self._width = len(self.buckets) + 4
+        self._lock = threading.Lock()
+        size = 1 + len(STAGES) * self._width
+        if path is None:
+            self._values = np.zeros(size)
+        else:
+            self._values = np.lib.format.open_memmap(path, mode='w+', dtype=np.float64, shape=(size,))
+        self._offsets = {stage: 1 + i * self._width for i, stage in enumerate(STAGES)}
+
+    def reset(self):
+        with self._lock:
+            self._values[:] = 0
+
+    def observe(self, stage, seconds, rules=None, rows=None):
+        slot = bisect.bisect_left(self.buckets, seconds)
+        base = self._offsets[stage]
+        n_slots = len(self.buckets) + 1
+        with self._lock:
+            self._values[base + slot] += 1
+            self._values[base + n_slots] += seconds
+            if rules is not None:
+                self._values[base + n_slots + 1] += rules
+            if rows is not None:
+                self._values[base + n_slots + 2] += rows
+
+    def count_selection(self):
+        with self._lock:
+            self._values[0] += 1
+
+    def snapshot(self):
+        with self._lock:
+            values = np.array(self._values)
+        return self._snapshot_of(values)
+
+    def _snapshot_of(self, values):
+        n_slots = len(self.buckets) + 1
+        stages = {}
+        for stage, base in self._offsets.items():
+            counts = [int(c) for c in values[base:base + n_slots]]
+            stages[stage] = {
+                'count': sum(counts),
+                'seconds': float(values[base + n_slots]),
+                'buckets': counts,
+                'rules_matched': int(values[base + n_slots + 1]),
+                'rows_scanned': int(values[base + n_slots + 2]),
+            }
+        return {'selections': int(values[0]), 'stages': stages}
+
+    def render_prometheus(self, prefix='meteorite', snap=None):
+        """Texte d'exposition Prometheus (version 0.0.4) ; snap : snapshot() par défaut."""
+        snap = self.snapshot() if snap is None else snap
+        lines = [
+            f"# HELP {prefix}_selections_total Sélections traitées par le moteur.",
+            f"# TYPE {prefix}_selections_total counter",
+            f"{prefix}_selections_total {snap['selections']}",
+            f"# HELP {prefix}_stage_seconds Latence par étape de process_user_selection.",
+            f"# TYPE {prefix}_stage_seconds histogram",
+        ]
+        for stage, data in snap['stages'].items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, data['buckets']):
+                cumulative += count
+                lines.append(f'{prefix}_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+            lines.append(f'{prefix}_stage_seconds_bucket{{stage="{stage}",le="+Inf"}} {data["count"]}')
+            lines.append(f'{prefix}_stage_seconds_sum{{stage="{stage}"}} {data["seconds"]:.6f}')
+            lines.append(f'{prefix}_stage_seconds_count{{stage="{stage}"}} {data["count"]}')
+        for name, key, help_text in (
+                ('rules_matched', 'rules_matched', "Règles retenues par l'étape de filtrage."),
+                ('rows_scanned', 'rows_scanned', "Lignes du dataset parcourues par l'étape.")):
+            lines.append(f"# HELP {prefix}_stage_{name}_total {help_text}")
+            lines.append(f"# TYPE {prefix}_stage_{name}_total counter")
+            for stage, data in snap['stages'].items():
+                lines.append(f'{prefix}_stage_{name}_total{{stage="{stage}"}} {data[key]}')
+        return "\n".join(lines) + "\n"
+
+
+def merge_stage_metrics(metrics, directory):
+    """
+    snapshot() cumulé de tous les fichiers stage_metrics_*.npy de directory
+    (un par processus, workers arrêtés compris : les compteurs ne reculent
+    pas quand gunicorn remplace un worker). metrics fournit les tranches.
+    """
+    total = np.zeros(len(metrics._values))
+    for name in os.listdir(directory):
+        if not (name.startswith('stage_metrics_') and name.endswith('.npy')):
+            continue
+        try:
+            values = np.load(os.path.join(directory, name))
+        except (OSError, ValueError):
+            continue  # fichier en cours de création
+        if values.shape == total.shape:
+            total += values
+    return metrics._snapshot_of(total)
+
+class StageRecorder:
+    """Étapes d'une seule sélection, dans l'ordre (même interface que StageMetrics)."""
+
+    def __init__(self):
+        self.stages = []
+
+    def observe(self, stage, seconds, rules=None, rows=None):
+        self.stages.append({'stage': stage, 'ms': seconds * 1000, 'rules': rules, 'rows': rows})
+
+    def count_selection(self):
+        pass
+
+
+def profile_user_selection(sel, rules, df, store=None, year_table=None, top_n=15):
+    """
+    process_user_selection sous cProfile (déterministe). Renvoie
+    (résultat, profil) : durée par étape, top_n fonctions les plus coûteuses
+    (temps propre), règles retenues et lignes parcourues. Les durées incluent
+    le surcoût du profileur : à comparer entre elles, pas à /metrics.
+    """
+    import cProfile
+    import pstats
+
+    recorder = StageRecorder()
+    profiler = cProfile.Profile()
+    start = time.perf_counter()
+    profiler.enable()
+    try:
+        result = process_user_selection(sel, rules, df, store=store, year_table=year_table,
+                                        metrics=recorder)
+    finally:
+        profiler.disable()
+    total = time.perf_counter() - start
+
+    entries = pstats.Stats(profiler).stats.items()
+    hottest = sorted(entries, key=lambda entry: -entry[1][2])[:top_n]
+    return result, {
+        'profiler': 'cProfile',
+        'total_ms': total * 1000,
+        'stages': recorder.stages,
+        'hottest_functions': [
+            {
+                'function': name,
+                'location': f"{filename.rsplit('/', 1)[-1]}:{line}",
+                'calls': calls,
+                'self_ms': self_time * 1000,
+                'cumulative_ms': cumulative * 1000,
+            }
+            for (filename, line, name), (_, calls, self_time, cumulative, _) in hottest
+        ],
+        'rules_matched': result['rules_count'],
+        'rows_scanned': sum(stage['rows'] or 0 for stage in recorder.stages),
+    }
+
+# -----------------------------
+# Traitement d'une sélection utilisateur
+# -----------------------------
+# Taille par défaut des listes names / sample_years d'une réponse
+DEFAULT_PAGE_SIZE = 20
+
+def process_user_selection(sel, rules, df, store=None, year_table=None, matched_ids=None,
+                           metrics=None, page=None):
+    """
+    Traite la sélection utilisateur pour prédire le type de météorite.
+    Utilise d'abord un filtrage non-strict, puis strict si trop de résultats.
+    store: stockage colonnaire optionnel construit par load_rule_store(rules).
+    year_table: table année -> période construite par build_year_period_table(df).
+    matched_ids: couple (ids_stricts, ids_non_stricts) déjà calculé (voir
+    match_rule_ids_batch), nécessite store.
+    metrics: StageMetrics (ou tout objet avec observe(stage, seconds, rules, rows))
+    recevant la durée de chaque étape ; None pour ne rien mesurer.
+    page: {'offset', 'limit', 'sample_seed'} pour names / sample_years ; par
+    défaut les DEFAULT_PAGE_SIZE premières valeurs (ordre du dataset). Les
+    totaux exacts sont dans names_total / sample_years_total.
+    """
+    # Récupérer les critères utilisateur
+    years = sel.get('years') or []
+    mass = sel.get('mass') or []
+    continents = sel.get('continents') or []
+
+    clock = time.perf_counter
+    if metrics is not None:
+        metrics.count_selection()
+
+    start = clock()
+    if matched_ids is not None:
+        # Correspondances déjà calculées en lot
+        filtered_rules = select_matched_rules(store, matched_ids[0])
+    else:
+        # D'abord essayer le mode strict
+        filtered_rules = filter_rules(rules, df, years, mass, continents, strict=True,
+                                      store=store, year_table=year_table)
+    if metrics is not None:
+        metrics.observe('filter_strict', clock() - start, rules=len(filtered_rules))
+
+    # Si pas assez de règles en mode strict, passer en mode non-strict
+    if len(filtered_rules) < 3:
+        start = clock()
+        if matched_ids is not None:
+            filtered_rules = select_matched_rules(store, matched_ids[1])
+        else:
+            filtered_rules = filter_rules(rules, df, years, mass, continents, strict=False,
+                                          store=store, year_table=year_table)
+        if metrics is not None:
+            metrics.observe('filter_loose', clock() - start, rules=len(filtered_rules))
+    
+    start = clock()
+    # Ne garder que les règles de qualité (lift >= 1)
+    if not filtered_rules.empty:
+        quality_rules = filtered_rules[filtered_rules['lift'] >= 1.0]
+        if not quality_rules.empty:
+            filtered_rules = quality_rules
+    
+    top_type, prob, type_distribution = get_most_probable_type(
+        filtered_rules, df, store, return_distribution=True
+    )
+    if metrics is not None:
+        metrics.observe('most_probable_type', clock() - start, rules=len(filtered_rules))
+
+    # Prédire les critères manquants
+    start = clock()
+    year_pred, mass_pred, continent_pred = predict_missing_criteria(
+        df, top_type, years if years else None, mass if mass else None, continents if continents else None
+    )
+    if metrics is not None:
+        metrics.observe('predict_missing_criteria', clock() - start, rows=len(df))
+
+    # Filtrer le dataset selon le type et les critères/prédictions
+    start = clock()
+    page = page or {}
+    names, countries, sample_years, mass_bin, df_points = get_type_info(
+        df, top_type, years if years else None, mass if mass else None, continents if continents else None,
+        year_pred, mass_pred, continent_pred,
+        limit=page.get('limit', DEFAULT_PAGE_SIZE), offset=page.get('offset', 0),
+        sample_seed=page.get('sample_seed')
+    )
+    if metrics is not None:
+        metrics.observe('get_type_info', clock() - start, rows=len(df))
+
+    # Si le type prédit est "OTHER", afficher le recclass le plus fréquent
+    display_type = top_type
+    if top_type == "OTHER" and not df_points.empty:
+        mode_result = df_points['recclass'].mode()
+        display_type = mode_result[0] if len(mode_result) > 0 else top_type
+
+    # Construire le résultat avec seulement les valeurs PRÉDITES (non fournies par l'utilisateur)
+    result = {
+        'selection': sel,
+        'filtered_rules': filtered_rules,
+        'top_type': display_type,
+        'probability': round(prob, 4),
+        'names': names,
+        'names_total': len(df_points),
+        'countries': countries,
+        'sample_years': sample_years,
+        'sample_years_total': int(df_points['year'].notna().sum()) if not df_points.empty else 0,
+        'rules_count': len(filtered_rules),
+        'rules_quality': get_rules_statistics(filtered_rules, store),
+        'type_distribution': type_distribution
+    }
+    
+    # N'ajouter les prédictions QUE si l'utilisateur n'a pas fourni la valeur
+    if not years:  # L'utilisateur n'a pas donné d'années → on prédit
+        result['predicted_years'] = year_pred
+    
+    if not mass:  # L'utilisateur n'a pas donné de masse → on prédit
+        result['predicted_mass'] = mass_pred
+    
+    if not continents:  # L'utilisateur n'a pas donné de continent → on prédit
+        result['predicted_continent'] = continent_pred
+    
+    return result
+    
+
+
+
+# -----------------------------
+# Traitement d'un lot de sélections
+# -----------------------------
+def process_user_selections(sels, rules, df, store, year_table=None, cache=None, metrics=None):
+    """
+    Traite un lot de sélections : les sélections identiques (même clé
+    normalisée) ne sont calculées qu'une fois, et la correspondance avec les
+    règles de toutes les sélections restantes se fait en un produit creux.
+    Chaque élément du résultat est identique à process_user_selection(sel),
+    ou est l'exception levée pour cette sélection.
+
+    Seule la correspondance avec les règles est vectorisée (~60k sélections/s).
+    Les étapes suivantes (predict_missing_criteria, get_type_info : filtres
+    pandas sur le dataset) tournent encore une fois par sélection distincte.
+    Sans doublons, sans cache ni table précalculée, le lot plafonne à
+    ~160 sélections/s, loin de 10k/s.
+    """
+    if year_table is None:
+        year_table = build_year_period_table(df)
+    if cache is not None:
+        cache.bind(rules, df)
+
+    results = [None] * len(sels)
+    pending = {}  # clé -> positions des sélections identiques dans le lot
+    for i, sel in enumerate(sels):
+        try:
+            key = normalize_selection(sel, year_table)
+        except Exception as e:
+            results[i] = e
+            continue
+        if key is None:
+            key = ('unique', i)
+        elif cache is not None:
+            cached = cache.get(key)
+            if cached is not None:
+                results[i] = dict(cached, selection=sel)
+                continue
+        pending.setdefault(key, []).append(i)
+
+    keys, criteria_list = [], []
+    for key, positions in pending.items():
+        sel = sels[positions[0]]
+        try:
+            criteria_list.append(build_user_criteria(
+                df, sel.get('years') or [], sel.get('mass') or [], sel.get('continents') or [], year_table
+            ))
+            keys.append(key)
+        except Exception as e:
+            for i in positions:
+                results[i] = e
+
+    matches = match_rule_ids_batch(store, criteria_list) if criteria_list else []
+    for key, matched_ids in zip(keys, matches):
+        positions = pending[key]
+        try:
+            result = process_user_selection(sels[positions[0]], rules, df, store=store,
+                                            year_table=year_table, matched_ids=matched_ids,
+                                            metrics=metrics)
+        except Exception as e:
+            for i in positions:
+                results[i] = e
+            continue
+        if cache is not None and key[0] != 'unique':
+            cache.put(key, result)
+        for i in positions:
+            results[i] = dict(result, selection=sels[i])
+
+    return results
+
+# -----------------------------
+# Scoring en flux (NDJSON)
+# -----------------------------
+def json_default(value):
+    """Conversion JSON des scalaires et tableaux NumPy."""
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    raise TypeError(f"Type non sérialisable : {type(value).__name__}")
+
+def peak_rss_mb():
+    """Pic de mémoire résidente du processus (Mo), None si indisponible."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+def _dumps_line(obj):
+    return json.dumps(obj, default=json_default)
+
+
+def score_ndjson(lines, predict_many, chunk_size=1000, stats=None, dumps=_dumps_line):
+    """
+    Lit des sélections JSON (une par ligne) par paquets de chunk_size et
+    génère une ligne JSON de résultat par sélection, dans le même ordre.
+    predict_many(sels) -> réponses : liste de dicts au format /predict.
+    Mémoire constante : ni l'entrée ni les résultats ne sont conservés.
+    stats (dict optionnel) reçoit 'rows' et 'seconds' en fin de parcours.
+    dumps(obj) -> str ou bytes encode chaque réponse (le serveur passe
+    serialization.dumps, celui des autres réponses JSON).
+    ValueError immédiate si chunk_size < 1 (avant toute lecture).
+    """
+    if isinstance(chunk_size, bool) or not isinstance(chunk_size, int) or chunk_size < 1:
+        raise ValueError(f"chunk_size doit être un entier ≥ 1 : {chunk_size!r}")
+    return _score_ndjson_chunks(lines, predict_many, chunk_size, stats, dumps)
+
+
+def _score_ndjson_chunks(lines, predict_many, chunk_size, stats, dumps):
+    start = time.perf_counter()
+    rows = 0
+    lines = (line for line in lines if line.strip())
+
+    while True:
+        chunk = list(itertools.islice(lines, chunk_size))
+        if not chunk:
+            break
+
+        responses = [None] * len(chunk)
+        sels, positions = [], []
+        for i, line in enumerate(chunk):
+            try:
+                payload = json.loads(line)
+            except ValueError as e:
+                responses[i] = {"error": f"JSON invalide : {e}"}
+                continue
+            if not isinstance(payload, dict):
+                responses[i] = {"error": "sélection invalide"}
+                continue
+            sels.append({
+                "years": payload.get("years"),
+                "mass": payload.get("mass"),
+                "continents": payload.get("continents")
+            })
+            positions.append(i)
+
+        for i, response in zip(positions, predict_many(sels)):
+            responses[i] = response
+
+        rows += len(chunk)
+        encoded = [dumps(r) for r in responses]
+        newline = b'\n' if isinstance(encoded[0], bytes) else '\n'
+        yield newline[:0].join(line + newline for line in encoded)
+
+    if stats is not None:
+        stats['rows'] = rows
+        stats['seconds'] = time.perf_counter() - start
+
+# -----------------------------
+# Réponse /predict et sélection normalisée
+# -----------------------------
+def format_prediction_response(result):
+    """
+    Construit la réponse JSON de /predict à partir du résultat de
+    process_user_selection (mêmes champs pour le moteur et la table précalculée).
+    """
+    response = {
+        "top_type": result["top_type"],
+        "probability": result["probability"],
+        "names": result["names"],
+        "countries": result["countries"],
+        "sample_years": result["sample_years"]
+    }
+
+    # Totaux exacts (les listes ci-dessus sont limitées)
+    if "names_total" in result:
+        response["names_total"] = result["names_total"]
+        response["sample_years_total"] = result["sample_years_total"]
+
+    # N'ajouter les prédictions que si elles existent
+    if "predicted_years" in result:
+        response["predicted_years"] = result["predicted_years"]
+    if "predicted_mass" in result:
+        response["predicted_mass"] = result["predicted_mass"]
+    if "predicted_continent" in result:
+        response["predicted_continent"] = result["predicted_continent"]
+
+    return response
+
+def _is_year(y):
+    return isinstance(y, (int, float)) and not isinstance(y, bool) and float(y).is_integer()
+
+def _normalize_labels(values):
+    """Liste de libellés (masses, continents) -> tuple trié, None si non supporté."""
+    if not values:
+        return ()
+    if not isinstance(values, list) or not all(isinstance(v, str) for v in values):
+        return None
+    return tuple(sorted(set(values)))
+
+def _years_key(years, year_table):
+    """
+    Années du dataset couvertes par l'entrée 'years' (tuple trié), si elle
+    n'est faite que d'années entières et de plages [start, end] entières.
+    Deux entrées qui couvrent les mêmes années du dataset donnent le même
+    résultat partout (périodes, isin sur 'year'). None si non supporté ou si
+    l'entrée ne désigne aucune année (cas traité différemment par get_type_info).
+    """
+    if not isinstance(years, list):
+        return None
+    for y in years:
+        is_range = isinstance(y, (list, tuple)) and len(y) == 2 and all(_is_year(v) for v in y)
+        if not (is_range or _is_year(y)):
+            return None
+
+    lows, highs = _year_intervals(years)
+    if not any(low <= high for low, high in zip(lows, highs)):
+        return None
+
+    known_years = year_table['years']
+    lo = np.searchsorted(known_years, np.asarray(lows, dtype=np.float64), side='left')
+    hi = np.searchsorted(known_years, np.asarray(highs, dtype=np.float64), side='right')
+    hits = [known_years[a:b] for a, b in zip(lo, hi) if a < b]
+    if not hits:
+        return ()
+    return tuple(int(y) for y in np.unique(np.concatenate(hits)))
+
+def normalize_selection(sel, year_table=None):
+    """
+    Clé hashable (years, mass, continents) d'une sélection dont le résultat
+    ne dépend pas de l'ordre ni des doublons : listes de libellés triées et,
+    sans year_table, une année isolée ou rien. Avec year_table, plages et
+    listes d'années sont ramenées aux années du dataset qu'elles couvrent.
+    Renvoie None pour les autres formes (plages de masse, années non
+    entières...) à traiter directement par le moteur.
+    """
+    years = sel.get('years') or []
+    if not years:
+        years_key = None
+    elif year_table is not None:
+        years_key = _years_key(years, year_table)
+        if years_key is None:
+            return None
+    elif isinstance(years, list) and len(years) == 1 and _is_year(years[0]):
+        years_key = (int(years[0]),)
+    else:
+        return None
+
+    mass_key = _normalize_labels(sel.get('mass'))
+    continents_key = _normalize_labels(sel.get('continents'))
+    if mass_key is None or continents_key is None:
+        return None
+
+    return (years_key, mass_key, continents_key)
+
+# -----------------------------
+# Cache LRU des prédictions
+# -----------------------------
+def _approx_nbytes(value):
+    """Estimation (grossière) de la mémoire occupée par un résultat."""
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=False).sum())
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(_approx_nbytes(v) for v in value.values())
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(_approx_nbytes(v) for v in value)
+    return sys.getsizeof(value)
+
+class SelectionCache:
+    """
+    Cache LRU borné en nombre d'entrées et en mémoire devant
+    process_user_selection, indexé par normalize_selection.
+    Vidé automatiquement si les règles ou le dataset changent d'objet.
+    """
+
+    def __init__(self, max_entries=1024, max_bytes=64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._nbytes = 0
+        self._sources = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def bind(self, rules, df):
+        """Associe le cache à (rules, df) ; tout changement invalide les entrées."""
+        with self._lock:
+            if self._sources is None or self._sources[0] is not rules or self._sources[1] is not df:
+                self._clear()
+                self._sources = (rules, df)
+
+    def invalidate(self):
+        with self._lock:
+            self._clear()
+
+    def _clear(self):
+        self._entries.clear()
+        self._nbytes = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, result):
+        nbytes = _approx_nbytes(result)
+        if nbytes > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._nbytes -= self._entries.pop(key)[1]
+            self._entries[key] = (result, nbytes)
+            self._nbytes += nbytes
+            while len(self._entries) > self.max_entries or self._nbytes > self.max_bytes:
+                _, (_, evicted_bytes) = self._entries.popitem(last=False)
+                self._nbytes -= evicted_bytes
+                self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self._nbytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions
+            }
+
+def cached_process_user_selection(sel, rules, df, cache, store=None, year_table=None, metrics=None):
+    """
+    process_user_selection avec mémoïsation LRU sur la sélection normalisée.
+    Les sélections non normalisables passent directement par le moteur.
+    metrics n'est alimenté que par les sélections effectivement calculées.
+    """
+    cache.bind(rules, df)
+    key = normalize_selection(sel, year_table)
+    if key is None:
+        return process_user_selection(sel, rules, df, store=store, year_table=year_table,
+                                      metrics=metrics)
+
+    result = cache.get(key)
+    if result is None:
+        result = process_user_selection(sel, rules, df, store=store, year_table=year_table,
+                                        metrics=metrics)
+        cache.put(key, result)
+    return dict(result, selection=sel)
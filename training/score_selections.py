@@ -0,0 +1,77 @@
+# score_selections.py
+"""
+Scoring en flux d'un fichier de sélections NDJSON (une sélection JSON
+par ligne, même format que /predict), à mémoire constante.
+
+    python score_selections.py selections.ndjson -o resultats.ndjson
+    cat selections.ndjson | python score_selections.py - > resultats.ndjson
+
+Débit (lignes/s) et pic de mémoire résidente sont affichés sur stderr.
+"""
+import argparse
+import os
+import pickle
+import sys
+
+import pandas as pd
+
+from rule_engine import (load_rule_store, build_year_period_table, process_user_selections,
+                    format_prediction_response, SelectionCache, score_ndjson, peak_rss_mb)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_DATASET_PATH = os.path.join(BASE_DIR, '..', 'data', 'meteorites_final_rebalanced.csv')
+DEFAULT_RULES_PATH = os.path.join(BASE_DIR, '..', 'backend', 'rules.pkl')
+
+
+def positive_int(value):
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"entier ≥ 1 attendu : {value}")
+    return number
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score un fichier NDJSON de sélections")
+    parser.add_argument('input', help="fichier NDJSON ou '-' pour l'entrée standard")
+    parser.add_argument('-o', '--output', default='-', help="fichier de sortie ('-' : sortie standard)")
+    parser.add_argument('--rules', default=DEFAULT_RULES_PATH)
+    parser.add_argument('--dataset', default=DEFAULT_DATASET_PATH)
+    parser.add_argument('--chunk-size', type=positive_int, default=1000)
+    parser.add_argument('--cache-size', type=int, default=4096,
+                        help="entrées du cache LRU des sélections (0 pour désactiver)")
+    args = parser.parse_args()
+
+    df = pd.read_csv(args.dataset)
+    with open(args.rules, 'rb') as f:
+        rules = pickle.load(f)
+    store = load_rule_store(rules)
+    year_table = build_year_period_table(df)
+    cache = SelectionCache(max_entries=args.cache_size) if args.cache_size > 0 else None
+
+    def predict_many(sels):
+        results = process_user_selections(sels, rules, df, store, year_table, cache)
+        return [{"error": str(r)} if isinstance(r, Exception) else format_prediction_response(r)
+                for r in results]
+
+    source = sys.stdin if args.input == '-' else open(args.input, encoding='utf-8')
+    target = sys.stdout if args.output == '-' else open(args.output, 'w', encoding='utf-8')
+    stats = {}
+    try:
+        for block in score_ndjson(source, predict_many, args.chunk_size, stats):
+            target.write(block)
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if target is not sys.stdout:
+            target.close()
+
+    rate = stats['rows'] / max(stats['seconds'], 1e-9)
+    summary = f"{stats['rows']} lignes en {stats['seconds']:.1f}s ({rate:.0f} lignes/s)"
+    peak = peak_rss_mb()
+    if peak is not None:
+        summary += f", pic RSS {peak:.0f} Mo"
+    print(summary, file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+# synthetic_data.py
+"""
+Données synthétiques pour les tests à l'échelle : dataset au schéma de
+meteorites_final (1M–50M lignes) et jeux de règles au format de rules.pkl
+(10k–1M règles).
+
+    python synthetic_data.py dataset --rows 5000000 -o ../data/synth_5M.csv
+    python synthetic_data.py rules --rules 100000 -o ../backend/rules_100k.pkl
+
+Dataset : bootstrap des lignes réelles (toutes les distributions marginales
+et jointes des colonnes catégorielles sont conservées), puis bruit sur les
+colonnes continues sans changer de catégorie : année gardée dans sa période,
+masse dans son mass_bin, coordonnées bornées. Noms uniques générés.
+Écrit par paquets de --chunk-size lignes : mémoire constante.
+
+Règles : toutes les règles candidates sur les colonnes minées par
+generate_rules.py (itemsets présents dans les données, 1 ou 2 conséquents),
+avec les métriques exactes de mlxtend (comptage de mining.py), puis les
+--rules meilleures par confiance. Le vocabulaire de ces quatre colonnes
+limite le nombre de règles distinctes (quelques dizaines de milliers) :
+--columns peut l'élargir (country...), et au-delà les règles sont
+répétées avec des métriques bruitées (l'index grossit comme en
+production, pas le vocabulaire).
+"""
+import argparse
+import os
+import pickle
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from mining import METRIC_COLUMNS, count_itemset_tables, encode_transactions, tables_to_rules
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_DATASET_PATH = os.path.join(BASE_DIR, '..', 'data', 'meteorites_final_rebalanced.csv')
+
+SCHEMA = ['name', 'year_period', 'year', 'recclass', 'continent', 'country', 'mass_cleaned',
+          'mass_bin', 'recclass_clean', 'fall', 'reclat', 'reclong']
+
+# Colonnes minées par generate_rules.py
+MINING_COLUMNS = ["year_period", "mass_bin", "continent", "recclass_clean"]
+
+# -----------------------------
+# Dataset synthétique
+# -----------------------------
+def _bounds_by(df, value_column, group_column):
+    """Bornes (min, max) de value_column par groupe, alignées sur les codes de group_column."""
+    codes, groups = pd.factorize(df[group_column])
+    bounds = df.groupby(codes)[value_column].agg(['min', 'max'])
+    return codes, bounds['min'].to_numpy(), bounds['max'].to_numpy()
+
+
+def synthesize_dataset(df, n_rows, seed=0, chunk_size=1_000_000):
+    """Génère n_rows lignes au schéma de df, par DataFrame de chunk_size lignes."""
+    rng = np.random.default_rng(seed)
+    source = df[SCHEMA].reset_index(drop=True)
+    period_codes, year_min, year_max = _bounds_by(source, 'year', 'year_period')
+    bin_codes, mass_min, mass_max = _bounds_by(source, 'mass_cleaned', 'mass_bin')
+
+    for start in range(0, n_rows, chunk_size):
+        size = min(chunk_size, n_rows - start)
+        rows = rng.integers(0, len(source), size)
+        chunk = source.iloc[rows].reset_index(drop=True)
+
+        # Année : ± quelques années, sans quitter la période d'origine
+        periods = period_codes[rows]
+        years = chunk['year'].to_numpy() + np.round(rng.normal(0, 2, size))
+        chunk['year'] = np.clip(years, year_min[periods], year_max[periods])
+
+        # Masse : bruit multiplicatif, bornée au mass_bin d'origine
+        bins = bin_codes[rows]
+        masses = chunk['mass_cleaned'].to_numpy() * np.exp(rng.normal(0, 0.1, size))
+        chunk['mass_cleaned'] = np.round(np.clip(masses, mass_min[bins], mass_max[bins]), 2)
+
+        # Coordonnées : ~25 km de bruit
+        chunk['reclat'] = np.clip(chunk['reclat'].to_numpy() + rng.normal(0, 0.25, size), -90, 90)
+        chunk['reclong'] = np.clip(chunk['reclong'].to_numpy() + rng.normal(0, 0.25, size), -180, 180)
+
+        chunk['name'] = [f"Synth {i:09d}" for i in range(start, start + size)]
+        yield chunk
+
+
+def write_dataset(df, n_rows, path, seed=0, chunk_size=1_000_000):
+    for i, chunk in enumerate(synthesize_dataset(df, n_rows, seed, chunk_size)):
+        chunk.to_csv(path, mode='w' if i == 0 else 'a', header=(i == 0), index=False)
+
+# -----------------------------
+# Règles synthétiques
+# -----------------------------
+def candidate_rules(df, columns=MINING_COLUMNS, max_consequents=2):
+    """Toutes les règles X → Y des itemsets présents, métriques au format mlxtend."""
+    codes, vocab = encode_transactions(df, columns)
+    tables = count_itemset_tables(codes, vocab, min_support=0.0)
+    rules = tables_to_rules(tables, vocab, min_confidence=0.0)
+    rules = rules[rules['consequents'].apply(len) <= max_consequents].reset_index(drop=True)
+    rules['antecedents'] = rules['antecedents'].apply(set)
+    rules['consequents'] = rules['consequents'].apply(set)
+    return rules
+
+
+def synthesize_rules(df, n_rules, columns=MINING_COLUMNS, seed=0, min_lift=1.0):
+    """
+    n_rules règles au format de rules.pkl : les meilleures candidates par
+    confiance (lift > min_lift), complétées si besoin par des répétitions
+    aux métriques bruitées (±1 %).
+    """
+    pool = candidate_rules(df, columns)
+    pool = pool[pool['lift'] > min_lift].sort_values('confidence', ascending=False, kind='stable')
+    rules = pool.head(n_rules)
+    missing = n_rules - len(rules)
+    if missing > 0:
+        print(f"⚠️ {len(pool)} règles distinctes possibles : {missing} répétitions bruitées",
+              file=sys.stderr)
+        rng = np.random.default_rng(seed)
+        extra = pool.iloc[rng.integers(0, len(pool), missing)].copy()
+        extra['antecedents'] = extra['antecedents'].apply(set)
+        extra['consequents'] = extra['consequents'].apply(set)
+        noise = np.exp(rng.normal(0, 0.01, missing))
+        for column in ('support', 'confidence', 'lift'):
+            extra[column] = extra[column].to_numpy() * noise
+        extra['confidence'] = extra['confidence'].clip(upper=1.0)
+        rules = pd.concat([rules, extra])
+    return rules.reset_index(drop=True)[['antecedents', 'consequents'] + METRIC_COLUMNS]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Dataset et règles synthétiques pour les tests à l'échelle")
+    parser.add_argument('--source', default=DEFAULT_DATASET_PATH, help="dataset réel de référence")
+    parser.add_argument('--seed', type=int, default=0)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    dataset = commands.add_parser('dataset', help="dataset synthétique (CSV)")
+    dataset.add_argument('--rows', type=int, default=1_000_000)
+    dataset.add_argument('--chunk-size', type=int, default=1_000_000)
+    dataset.add_argument('-o', '--output', required=True)
+
+    rules = commands.add_parser('rules', help="jeu de règles synthétique (pickle)")
+    rules.add_argument('--rules', type=int, default=10_000)
+    rules.add_argument('--columns', nargs='+', default=MINING_COLUMNS)
+    rules.add_argument('-o', '--output', required=True)
+    args = parser.parse_args()
+
+    df = pd.read_csv(args.source)
+    start = time.perf_counter()
+    if args.command == 'dataset':
+        write_dataset(df, args.rows, args.output, args.seed, args.chunk_size)
+        print(f"✅ {args.rows} lignes écrites dans {args.output} ({time.perf_counter() - start:.1f}s)")
+    else:
+        synthetic = synthesize_rules(df, args.rules, args.columns, args.seed)
+        with open(args.output, 'wb') as f:
+            pickle.dump(synthetic, f)
+        print(f"✅ {len(synthetic)} règles écrites dans {args.output} ({time.perf_counter() - start:.1f}s)")
+
+
+if __name__ == "__main__":
+    main()